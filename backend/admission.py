@@ -0,0 +1,88 @@
+import math
+import os
+
+# Used until the first jobs and LLM calls have been observed
+DEFAULT_CALLS_PER_JOB = 8.0
+DEFAULT_CALL_SECONDS = 2.0
+# Weight of the newest finished job in the moving average of calls per job
+CALLS_SMOOTHING = 0.2
+
+class OverloadedError(Exception):
+    """A new job would not finish within the admission deadline at the current load"""
+
+    def __init__(self, retry_after: int, estimated_seconds: float):
+        super().__init__(f"Server is at capacity; estimated completion {estimated_seconds:.0f}s")
+        self.retry_after = retry_after
+        self.estimated_seconds = estimated_seconds
+
+class AdmissionController:
+    """Admit improvement jobs only while they can finish within max_seconds.
+
+    Jobs make their LLM calls one after another and the scheduler shares its
+    `capacity` slots fairly, so with n jobs contending each call effectively
+    takes call_seconds * n / capacity once n exceeds capacity. From the observed
+    call latency and calls per job this gives an adaptive limit on concurrent
+    jobs; requests above it are shed instead of slowing down every admitted job.
+    Contention is the larger of the admitted jobs and the scheduler's in-flight
+    plus queued calls, which also covers load from batches.
+    """
+
+    def __init__(self, scheduler, max_seconds: float):
+        self.scheduler = scheduler
+        self.max_seconds = max_seconds
+        self.active = 0
+        self.calls_per_job = None
+
+    @property
+    def job_seconds(self) -> float:
+        """Expected seconds of LLM time for one job running alone"""
+        calls = self.calls_per_job or DEFAULT_CALLS_PER_JOB
+        return calls * (self.scheduler.call_seconds or DEFAULT_CALL_SECONDS)
+
+    @property
+    def contenders(self) -> int:
+        return max(self.active, self.scheduler.in_flight + self.scheduler.queue_depth)
+
+    @property
+    def limit(self) -> int:
+        """Concurrent jobs that can each still finish within max_seconds"""
+        return max(1, math.floor(self.max_seconds * self.scheduler.capacity / self.job_seconds))
+
+    def estimated_seconds(self) -> float:
+        """Estimated completion time of a job admitted now"""
+        return self.job_seconds * max(1.0, (self.contenders + 1) / self.scheduler.capacity)
+
+    def admit(self):
+        """Count a new job in, or raise OverloadedError with a Retry-After hint"""
+        excess = self.contenders + 1 - self.limit
+        if self.max_seconds and excess > 0:
+            # Jobs drain at capacity / job_seconds per second; wait for `excess` of them
+            retry_after = max(1, math.ceil(excess * self.job_seconds / self.scheduler.capacity))
+            raise OverloadedError(retry_after, self.estimated_seconds())
+        self.active += 1
+
+    def track(self):
+        """Count in a job that must run regardless of load, e.g. one resumed after a restart"""
+        self.active += 1
+
+    def finish(self, llm_calls: int = None):
+        self.active -= 1
+        if not llm_calls:
+            return
+        if self.calls_per_job is None:
+            self.calls_per_job = float(llm_calls)
+        else:
+            self.calls_per_job += CALLS_SMOOTHING * (llm_calls - self.calls_per_job)
+
+_default_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """The controller for the default engine's scheduler; ADMISSION_MAX_SECONDS=0 admits everything"""
+    global _default_controller
+    if _default_controller is None:
+        from prompt_engine import get_default_engine
+        _default_controller = AdmissionController(
+            get_default_engine().scheduler,
+            max_seconds=float(os.getenv("ADMISSION_MAX_SECONDS", "120"))
+        )
+    return _default_controller
@@ -1,27 +1,129 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import os
 import uuid
+import json
+import asyncio
+import logging
 from dotenv import load_dotenv
 from functools import wraps
+from contextlib import asynccontextmanager
 from collections import defaultdict
 from models import PromptRequest, JobStatus, JobResponse, UserCreate, UserLogin, UserResponse
 from typing import List
-from prompt_engine import PromptEngine, improve_prompt
-from services.prompt_service import PromptService
+from prompt_engine import improve_prompt, get_default_engine
+from services.prompt_service import PromptService, result_scores
+from services.stats_service import StatsService
+from services.archive_service import ArchiveService
 from services.user_service import UserService
 from auth.dependencies import get_current_user
-from database.connections import get_db
+from services.job_service import JobService
+from scheduler import current_tenant
+from tokens import PromptTooLongError, count_tokens
+from streaming import JobEvents, format_sse
+from batch import BatchRunner, BatchState, parse_jsonl, batch_prompt_limit, BATCHES_PER_DAY, BATCH_RETENTION_SECONDS
+from tracing import trace, span
+from admission import OverloadedError, get_admission_controller
+from database.connections import get_db, create_tables, SessionLocal, engine as db_engine
+from sqlalchemy import text
 from database.models import User
 
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+readiness = {"database": False, "provider": False}
+
+# Retention: results older than HISTORY_RETENTION_DAYS move to the compressed archive (0 keeps them in place)
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.5"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Jobs are leased to the process running them and renewed every JOB_HEARTBEAT_SECONDS; a job whose lease is
+# older than JOB_LEASE_SECONDS was orphaned by a dead process and is resumed by whichever process claims it
+PROCESS_ID = str(uuid.uuid4())
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+def warm_database():
+    create_tables()
+    with db_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    readiness["database"] = True
+
+def warm_provider():
+    from auth.jwt_handler import get_pwd_context
+    get_pwd_context()
+    engine = get_default_engine()
+    engine.client
+    # Loads (and on first run downloads) the tokenizer instead of the first prompt paying for it
+    count_tokens("", engine.model)
+    import scoring  # noqa: F401 (numpy, off the import path but needed by the first job)
+    readiness["provider"] = True
+
+def archive_expired_batch(cutoff: datetime) -> int:
+    """Archive one batch of expired results and purge one batch of expired jobs; returns the larger count"""
+    db = SessionLocal()
+    try:
+        archive = ArchiveService(db)
+        return max(archive.archive_batch(cutoff, ARCHIVE_BATCH_SIZE), archive.purge_jobs(cutoff, ARCHIVE_BATCH_SIZE))
+    finally:
+        db.close()
+
+async def compact_history():
+    """Archive expired results in small batches, pausing between them so writers never wait long for the lock"""
+    while True:
+        try:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=HISTORY_RETENTION_DAYS)
+            while await asyncio.to_thread(archive_expired_batch, cutoff) == ARCHIVE_BATCH_SIZE:
+                await asyncio.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+        except Exception:
+            logger.exception("History compaction failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+def renew_job_leases():
+    db = SessionLocal()
+    try:
+        JobService(db).renew_leases(PROCESS_ID)
+    finally:
+        db.close()
+
+async def maintain_job_leases():
+    """Keep this process's job leases fresh and pick up jobs orphaned by other processes"""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await asyncio.to_thread(renew_job_leases)
+            recover_interrupted_jobs()
+        except Exception:
+            logger.exception("Job lease maintenance failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema is needed by every request, but the provider client and password
+    # hasher are warmed in the background; /ready flips once both are done
+    await asyncio.to_thread(warm_database)
+    recover_interrupted_jobs()
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_provider))
+    compaction_task = asyncio.create_task(compact_history()) if HISTORY_RETENTION_DAYS > 0 else None
+    lease_task = asyncio.create_task(maintain_job_leases())
+    yield
+    lease_task.cancel()
+    warm_up_task.cancel()
+    if compaction_task:
+        compaction_task.cancel()
+
 app = FastAPI(
     title="Prompt Engineering API",
     description="API for improving and optimizing prompts using AI evaluation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 origins = [
@@ -38,15 +140,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
+class BufferedGZipMiddleware(GZipMiddleware):
+    """GZip that leaves streamed endpoints alone, since compressing them would hold events back"""
+    streaming_suffixes = ("/events", "/results")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith(self.streaming_suffixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Job status and history bodies carry full prompt text; compress anything non-trivial
+app.add_middleware(BufferedGZipMiddleware, minimum_size=1000)
+
+# Clients may cache polled resources but must revalidate with If-None-Match every time
+CACHE_CONTROL = "private, no-cache"
+
 jobs = {}
+batches = {}
+recovered_tasks = set()
+job_events = JobEvents()
 
 # User-based rate limiting storage
 user_requests = defaultdict(list)  # {user_id: [timestamp1, timestamp2, ...]}
+batch_requests = defaultdict(list)  # same, for /batches, so batches and single jobs have separate quotas
+
+# Errors raised before any work is done: bad input (400, 413, 422) or load shedding (503)
+UNSERVED_STATUS_CODES = {400, 413, 422, 503}
+
+def user_rate_limit(max_requests: int, window_hours: int = 24, requests_log: dict = None):
+    """Decorator for user-based rate limiting, counted in requests_log (default: user_requests)"""
+    requests_log = user_requests if requests_log is None else requests_log
 
-def user_rate_limit(max_requests: int, window_hours: int = 24):
-    """Decorator for user-based rate limiting"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -65,23 +193,29 @@ def user_rate_limit(max_requests: int, window_hours: int = 24):
             window_start = now - timedelta(hours=window_hours)
             
             # Clean old requests outside the window
-            user_requests[user_id] = [
-                req_time for req_time in user_requests[user_id] 
+            requests_log[user_id] = [
+                req_time for req_time in requests_log[user_id] 
                 if req_time > window_start
             ]
             
             # Check if user has exceeded the limit
-            if len(user_requests[user_id]) >= max_requests:
+            if len(requests_log[user_id]) >= max_requests:
                 raise HTTPException(
                     status_code=429, 
                     detail=f"Rate limit exceeded: {max_requests} requests per {window_hours} hours"
                 )
             
             # Add current request timestamp
-            user_requests[user_id].append(now)
+            requests_log[user_id].append(now)
             
             # Call the original function
-            return await func(*args, **kwargs)
+            try:
+                return await func(*args, **kwargs)
+            except HTTPException as e:
+                # A request rejected as invalid or shed for load was never served, so it does not count
+                if e.status_code in UNSERVED_STATUS_CODES:
+                    requests_log[user_id].remove(now)
+                raise
         return wrapper
     return decorator
 
@@ -119,10 +253,20 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 # Prompt history endpoints
 @app.get("/prompt-history")
 async def get_prompt_history(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     prompt_service = PromptService(db, current_user.id)
+
+    latest_id, count = prompt_service.get_history_version()
+    etag = f'W/"history-{latest_id}-{count}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
     history = prompt_service.get_user_prompt_history()
     
     prompts = [
@@ -130,7 +274,7 @@ async def get_prompt_history(
             "id": prompt.id,
             "initial_prompt": prompt.original_prompt,
             "final_prompt": prompt.improved_prompt,
-            "optimization_score": min(100, max(0, prompt.total_iterations * 10 + 50)),  # Convert iterations to a score
+            "optimization_score": optimization_score(prompt),
             "created_at": prompt.created_at.isoformat()
         }
         for prompt in history
@@ -138,66 +282,242 @@ async def get_prompt_history(
     
     return {"prompts": prompts}
 
-@app.post("/improve-prompt", response_model=JobResponse)
-@user_rate_limit(max_requests=5, window_hours=24)  # 5 requests per day per user
-async def start_prompt_improvement(
-    request: PromptRequest, 
-    background_tasks: BackgroundTasks,
+def optimization_score(prompt) -> int:
+    """Final average judge score on a 0-100 scale"""
+    if prompt.final_score is None:
+        # Saved before scores were stored: fall back to the old estimate from the iteration count
+        return min(100, max(0, prompt.total_iterations * 10 + 50))
+    return round(prompt.final_score * 10)
+
+@app.get("/stats")
+async def get_stats(
+    days: int = Query(default=30, ge=1, le=365),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {
+    """Jobs, iterations, average score gain and tokens per day, from the per-user daily rollups"""
+    return StatsService(db).get_user_stats(current_user.id, days)
+
+@app.get("/prompt-history/search")
+async def search_prompt_history(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    prompt_service = PromptService(db, current_user.id)
+    try:
+        found = prompt_service.search_prompt_history(q, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    results = [
+        {
+            "id": row["id"],
+            "initial_prompt": row["original_prompt"],
+            "final_prompt": row["improved_prompt"],
+            "initial_snippet": row["original_snippet"],
+            "final_snippet": row["improved_snippet"],
+            "rank": row["rank"],
+            "created_at": row["created_at"].isoformat()
+        }
+        for row in found["results"]
+    ]
+
+    return {"results": results, "total": found["total"], "limit": limit, "offset": offset}
+
+@app.get("/prompt-history/{prompt_id}/trajectory")
+async def get_prompt_trajectory(
+    prompt_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    prompt_service = PromptService(db, current_user.id)
+    if not prompt_service.get_prompt_by_id(prompt_id):
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    checkpoints = JobService(db).get_trajectory(prompt_id)
+    return {
+        "prompt_id": prompt_id,
+        "iterations": [JobService.checkpoint_to_dict(checkpoint) for checkpoint in checkpoints]
+    }
+
+def new_job_entry(job_id: str, user_id: str, request: PromptRequest, created_at: datetime = None) -> dict:
+    return {
         "job_id": job_id,
-        "user_id": current_user.id,
+        "user_id": user_id,
         "status": "pending",
         "progress": 0,
         "total_iterations": request.max_iterations,
         "current_iteration": None,
         "final_prompt": None,
         "error": None,
-        "created_at": datetime.now(),
-        "completed_at": None
+        "created_at": created_at or datetime.now(),
+        "completed_at": None,
+        "metrics": None,
+        "timings": None,
+        "version": 0
     }
 
-    async def run_improvement():
-        try:
-            jobs[job_id]["status"] = "running"
-            
-            async def progress_callback(iteration_data):
-                if job_id in jobs: 
-                    jobs[job_id]["progress"] = iteration_data["iteration"]
-                    jobs[job_id]["current_iteration"] = iteration_data
-            
-            result = await improve_prompt(request, progress_callback)
-            
-            if job_id in jobs:
-                jobs[job_id]["status"] = result["status"]
-                jobs[job_id]["final_prompt"] = result["final_prompt"]
-                jobs[job_id]["completed_at"] = datetime.now()
-                if result["iterations"]:
-                    jobs[job_id]["progress"] = len(result["iterations"])
-                    jobs[job_id]["current_iteration"] = result["iterations"][-1]
-                jobs[job_id]["error"] = result["error"]
-                
-                # Save to database if successful
-                if result["status"] == "completed" and result["final_prompt"]:
-                    prompt_service = PromptService(db, current_user.id)
-                    iterations_count = len(result["iterations"]) if result["iterations"] else 0
-                    prompt_service.save_prompt_result(
-                        original_prompt=request.prompt,
-                        improved_prompt=result["final_prompt"], 
-                        total_iterations=iterations_count
-                    )
-                    prompt_service.update_user_stats()
-                    
-        except Exception as e:
-            if job_id in jobs:  
-                jobs[job_id]["status"] = "failed"
-                jobs[job_id]["error"] = str(e)
-                jobs[job_id]["completed_at"] = datetime.now()
-
-    background_tasks.add_task(run_improvement)
+def update_job(job_id: str, **changes):
+    """Apply changes to an in-memory job and bump its version, which backs the job's ETag"""
+    job = jobs.get(job_id)
+    if job is None:
+        return
+    job.update(changes)
+    job["version"] += 1
+
+def job_summary(job: dict) -> dict:
+    return {key: job[key] for key in ("status", "progress", "total_iterations", "final_prompt", "error")}
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110 8.8.3.2): ignore the W/ prefix on both sides
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+async def run_improvement(job_id: str, request: PromptRequest, user_id: str, resume_from: dict = None):
+    try:
+        with trace("job", job_id=job_id, resumed=resume_from is not None) as job_trace:
+            await execute_improvement(job_id, request, user_id, resume_from, job_trace)
+    finally:
+        metrics = jobs.get(job_id, {}).get("metrics") or {}
+        get_admission_controller().finish(metrics.get("llm_calls"))
+
+async def execute_improvement(job_id: str, request: PromptRequest, user_id: str, resume_from: dict, job_trace):
+    db = SessionLocal()
+    job_service = JobService(db)
+    user = db.get(User, user_id)
+    tenant_token = current_tenant.set((user_id, user.tier if user else "free"))
+
+    def timings():
+        return job_trace.timings() if job_trace else None
+
+    try:
+        update_job(job_id, status="running")
+        with span("db_commit", operation="mark_running"):
+            job_service.mark_running(job_id)
+
+        async def progress_callback(iteration_data):
+            update_job(job_id, progress=iteration_data["iteration"], current_iteration=iteration_data,
+                       metrics=iteration_data.get("metrics"), timings=timings())
+            job_events.publish(job_id, "iteration", iteration_data)
+
+        async def refinement_callback(iteration, event):
+            job_events.publish(job_id, "refinement", {"iteration": iteration} | event)
+
+        async def checkpoint_callback(checkpoint):
+            with span("db_commit", operation="checkpoint"):
+                job_service.save_checkpoint(job_id, checkpoint)
+
+        result = await improve_prompt(request, progress_callback, checkpoint_callback, resume_from,
+                                      refinement_callback if request.stream else None)
+
+        final_state = {
+            "status": result["status"],
+            "final_prompt": result["final_prompt"],
+            "completed_at": datetime.now(),
+            "error": result["error"],
+            "metrics": result["metrics"]
+        }
+        if result["iterations"]:
+            final_state["progress"] = result["total_iterations"]
+            final_state["current_iteration"] = result["iterations"][-1]
+        update_job(job_id, **final_state)
+
+        # Save to database if successful
+        with span("db_commit", operation="save_result"):
+            if result["status"] == "completed" and result["final_prompt"]:
+                prompt_service = PromptService(db, user_id)
+                saved = prompt_service.save_prompt_result(
+                    original_prompt=request.prompt,
+                    improved_prompt=result["final_prompt"],
+                    total_iterations=result["total_iterations"],
+                    **result_scores(result)
+                )
+                prompt_service.update_user_stats()
+                job_service.finish_job(job_id, "completed", prompt_result_id=saved.id)
+            else:
+                job_service.finish_job(job_id, result["status"], error=result["error"])
+
+    except Exception as e:
+        update_job(job_id, status="failed", error=str(e), completed_at=datetime.now())
+        job_service.finish_job(job_id, "failed", error=str(e))
+    finally:
+        update_job(job_id, timings=timings())
+        if job_id in jobs:
+            job_events.publish(job_id, "done", job_summary(jobs[job_id]))
+        current_tenant.reset(tenant_token)
+        db.close()
+
+def recover_interrupted_jobs():
+    """Claim jobs whose lease went stale (their process died) and resume them from their last checkpoint"""
+    db = SessionLocal()
+    try:
+        job_service = JobService(db)
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+        for job in job_service.claim_interrupted_jobs(PROCESS_ID, stale_before):
+            if jobs.get(job.id, {}).get("status") in ("pending", "running"):
+                # Still running here; the lease only went stale because the heartbeat was late
+                continue
+            try:
+                request = PromptRequest(**job.request)
+                jobs[job.id] = new_job_entry(job.id, job.user_id, request, job.created_at)
+
+                resume_from = None
+                checkpoint = job_service.get_last_checkpoint(job.id)
+                if checkpoint:
+                    resume_from = JobService.checkpoint_to_dict(checkpoint)
+                    if checkpoint.iteration > 0:
+                        update_job(job.id, progress=checkpoint.iteration, current_iteration=resume_from)
+            except Exception as e:
+                # One job that can no longer be resumed must not keep the app from starting on every restart
+                db.rollback()
+                jobs.pop(job.id, None)
+                job_service.finish_job(job.id, "failed", error=f"Could not resume job: {e}")
+                continue
+
+            get_admission_controller().track()
+            task = asyncio.create_task(run_improvement(job.id, request, job.user_id, resume_from))
+            recovered_tasks.add(task)
+            task.add_done_callback(recovered_tasks.discard)
+    finally:
+        db.close()
+
+@app.post("/improve-prompt", response_model=JobResponse)
+@user_rate_limit(max_requests=5, window_hours=24)  # 5 requests per day per user
+async def start_prompt_improvement(
+    request: PromptRequest, 
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        get_default_engine().refine_budget(request.prompt, request.criteria)
+    except PromptTooLongError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    admission = get_admission_controller()
+    try:
+        admission.admit()
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    job_id = str(uuid.uuid4())
+    try:
+        jobs[job_id] = new_job_entry(job_id, current_user.id, request)
+        JobService(db).create_job(job_id, current_user.id, request.model_dump(), owner=PROCESS_ID)
+    except Exception:
+        admission.finish()
+        raise
+
+    background_tasks.add_task(run_improvement, job_id, request, current_user.id)
 
     return JobResponse(
         job_id=job_id,
@@ -206,16 +526,157 @@ async def start_prompt_improvement(
     )
 
 @app.get("/job/{job_id}", response_model=JobStatus)
-async def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+async def get_job_status(
+    job_id: str,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail="Job not found")
     
     job = jobs[job_id]
     if job["user_id"] != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied: Job belongs to another user")
-    
+
+    # Versions restart at 0 when a job is recovered, so the process id keeps tags from before a restart stale
+    etag = f'W/"job-{job_id}-{PROCESS_ID}-{job["version"]}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
     return JobStatus(**job)
 
+@app.get("/job/{job_id}/events")
+async def stream_job_events(job_id: str, current_user: User = Depends(get_current_user)):
+    """Server-sent events: iteration results, streamed refinement text, then a final done event"""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    job = jobs[job_id]
+    if job["user_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied: Job belongs to another user")
+
+    queue = job_events.subscribe(job_id)
+
+    async def event_stream():
+        try:
+            yield format_sse("status", job_summary(job))
+            if job["status"] in ("completed", "failed"):
+                yield format_sse("done", job_summary(job))
+                return
+            while True:
+                event, data = await queue.get()
+                yield format_sse(event, data)
+                if event == "done":
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_batch(state: BatchState, items):
+    db = SessionLocal()
+    user = db.get(User, state.user_id)
+    tenant_token = current_tenant.set((state.user_id, user.tier if user else "free"))
+    prompt_service = PromptService(db, state.user_id)
+    state.status = "running"
+    try:
+        async def on_result(result):
+            # A duplicate shares the result of an earlier line, which is already saved and counted
+            if result["status"] == "completed" and result["final_prompt"] and result["duplicate_of"] is None:
+                prompt_service.save_prompt_result(
+                    original_prompt=result["original_prompt"],
+                    improved_prompt=result["final_prompt"],
+                    total_iterations=result["total_iterations"],
+                    initial_score=result["initial_score"],
+                    final_score=result["final_score"],
+                    tokens_used=result["metrics"].get("prompt_tokens", 0) + result["metrics"].get("completion_tokens", 0)
+                )
+                prompt_service.update_user_stats()
+            state.add_result(result)
+
+        await BatchRunner(get_default_engine()).run(items, on_result)
+        state.finish("completed")
+    except Exception as e:
+        state.error = str(e)
+        state.finish("failed")
+    finally:
+        current_tenant.reset(tenant_token)
+        db.close()
+
+def expire_batches():
+    """Drop finished batches older than BATCH_RETENTION_SECONDS; their results are already saved"""
+    cutoff = datetime.now() - timedelta(seconds=BATCH_RETENTION_SECONDS)
+    for batch_id in [batch_id for batch_id, state in batches.items() if state.done and state.completed_at < cutoff]:
+        del batches[batch_id]
+
+def get_user_batch(batch_id: str, user: User) -> BatchState:
+    expire_batches()
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    state = batches[batch_id]
+    if state.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied: Batch belongs to another user")
+    return state
+
+@app.post("/batches")
+@user_rate_limit(max_requests=BATCHES_PER_DAY, window_hours=24, requests_log=batch_requests)
+async def create_batch(
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    """Start improving every PromptRequest in a JSONL request body"""
+    try:
+        items = parse_jsonl((await http_request.body()).decode("utf-8"))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be UTF-8 encoded JSONL")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    limit = batch_prompt_limit(current_user.tier)
+    if len(items) > limit:
+        raise HTTPException(status_code=413,
+                            detail=f"Batch has {len(items)} prompts; the {current_user.tier} tier allows {limit}")
+
+    expire_batches()
+    state = BatchState(str(uuid.uuid4()), current_user.id, len(items))
+    batches[state.batch_id] = state
+    background_tasks.add_task(run_batch, state, items)
+
+    return {"batch_id": state.batch_id, "status": state.status, "total": state.total}
+
+@app.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str, current_user: User = Depends(get_current_user)):
+    return get_user_batch(batch_id, current_user).progress()
+
+@app.get("/batches/{batch_id}/results")
+async def stream_batch_results(batch_id: str, current_user: User = Depends(get_current_user)):
+    """NDJSON of finished results in completion order; stays open until the batch is done"""
+    state = get_user_batch(batch_id, current_user)
+
+    async def results():
+        async for result in state.follow():
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.delete("/batches/{batch_id}")
+async def delete_batch(batch_id: str, current_user: User = Depends(get_current_user)):
+    state = get_user_batch(batch_id, current_user)
+    if not state.done:
+        raise HTTPException(status_code=409, detail="Batch is still running")
+
+    del batches[batch_id]
+    return {"message": f"Batch {batch_id} deleted successfully"}
+
 @app.get("/jobs")
 async def list_jobs(current_user: User = Depends(get_current_user)):
     user_jobs = {
@@ -240,6 +701,12 @@ async def delete_job(job_id: str, current_user: User = Depends(get_current_user)
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
+@app.get("/ready")
+async def readiness_check():
+    ready = all(readiness.values())
+    body = {"status": "ready" if ready else "starting", "checks": readiness, "timestamp": datetime.now().isoformat()}
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 @app.get("/")
 async def root():
     return {
@@ -0,0 +1,198 @@
+"""Bulk prompt improvement, shared by the /batches API and the command line.
+
+Usage: python -m batch prompts.jsonl -o results.jsonl [--concurrency 4]
+
+Each input line is a PromptRequest as JSON. Results are appended to the output
+file as they complete, one JSON object per line keyed by input line number, so
+re-running the same command skips lines that already have a result.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from pydantic import ValidationError
+from models import PromptRequest
+from scheduler import parse_tier_weights
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# API only: batches per user per day, and prompts per batch by user tier (the CLI is bounded by MAX_BATCH_SIZE alone)
+BATCHES_PER_DAY = int(os.getenv("BATCHES_PER_DAY", "2"))
+BATCH_PROMPT_LIMITS = parse_tier_weights(os.getenv("BATCH_PROMPT_LIMITS", "free=20,pro=1000"))
+# Finished API batches, with all their results, are kept in memory this long
+BATCH_RETENTION_SECONDS = float(os.getenv("BATCH_RETENTION_SECONDS", "3600"))
+
+def batch_prompt_limit(tier: str) -> int:
+    """Most prompts one API batch may hold for a user on `tier`; unknown tiers get the free limit"""
+    limit = BATCH_PROMPT_LIMITS.get(tier, BATCH_PROMPT_LIMITS.get("free", MAX_BATCH_SIZE))
+    return min(int(limit), MAX_BATCH_SIZE)
+
+def parse_jsonl(text: str):
+    """Parse JSONL into [(line_number, PromptRequest)], skipping blank lines"""
+    items = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            items.append((line_number, PromptRequest(**json.loads(line))))
+        except (json.JSONDecodeError, TypeError, ValidationError) as e:
+            raise ValueError(f"Line {line_number}: {e}")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch has {len(items)} prompts; the limit is {MAX_BATCH_SIZE}")
+    return items
+
+class BatchRunner:
+    """Improve many prompts through a bounded pool of workers sharing one engine.
+
+    Identical requests in a batch are improved once: later copies get the same result
+    with `duplicate_of` set to the line that ran it, so its usage is only counted once.
+    Repeated prompt texts also hit the engine's score cache.
+    """
+
+    def __init__(self, engine, concurrency: int = BATCH_CONCURRENCY):
+        self.engine = engine
+        self.concurrency = concurrency
+        self._inflight = {}
+
+    async def _improve(self, line: int, request: PromptRequest):
+        """The engine result for request and the line whose run produced it"""
+        key = request.model_dump_json(exclude={"stream"})
+        if key not in self._inflight:
+            self._inflight[key] = (line, asyncio.ensure_future(self.engine.improve_prompt(request)))
+        first_line, future = self._inflight[key]
+        return await asyncio.shield(future), first_line
+
+    async def improve(self, line: int, request: PromptRequest) -> dict:
+        first_line = line
+        try:
+            result, first_line = await self._improve(line, request)
+        except Exception as e:
+            result = {"status": "failed", "final_prompt": None, "total_iterations": 0, "metrics": {}, "error": str(e)}
+        return {
+            "line": line,
+            "duplicate_of": first_line if first_line != line else None,
+            "status": result["status"],
+            "original_prompt": request.prompt,
+            "final_prompt": result["final_prompt"],
+            "total_iterations": result["total_iterations"],
+            "initial_score": (result.get("initial_scores") or {}).get("average"),
+            "final_score": (result.get("final_scores") or {}).get("average"),
+            "metrics": result["metrics"],
+            "error": result["error"],
+        }
+
+    async def run(self, items, on_result):
+        """Improve every (line, request) in items, awaiting on_result(result) as each one finishes"""
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+
+        async def worker():
+            while not queue.empty():
+                line, request = queue.get_nowait()
+                await on_result(await self.improve(line, request))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(items)))))
+
+class BatchState:
+    """Progress and results of one API batch, followable while it runs"""
+
+    def __init__(self, batch_id: str, user_id: str, total: int):
+        self.batch_id = batch_id
+        self.user_id = user_id
+        self.total = total
+        self.status = "pending"
+        self.results = []
+        self.failed = 0
+        self.error = None
+        self.created_at = datetime.now()
+        self.completed_at = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def add_result(self, result: dict):
+        self.results.append(result)
+        if result["status"] != "completed":
+            self.failed += 1
+        self._notify()
+
+    def finish(self, status: str = "completed"):
+        self.status = status
+        self.completed_at = datetime.now()
+        self._notify()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def progress(self) -> dict:
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.results),
+            "failed": self.failed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+    async def follow(self):
+        """Yield results in completion order, waiting for new ones until the batch is done"""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.results):
+                yield self.results[sent]
+                sent += 1
+            if self.done:
+                return
+            await changed.wait()
+
+def read_completed_lines(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    completed = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line; that prompt is redone
+                continue
+            if result.get("status") == "completed":
+                completed.add(result["line"])
+    return completed
+
+async def run_file(input_path: str, output_path: str, concurrency: int):
+    from prompt_engine import get_default_engine
+
+    with open(input_path) as f:
+        items = parse_jsonl(f.read())
+    done = read_completed_lines(output_path)
+    pending = [(line, request) for line, request in items if line not in done]
+    print(f"{len(items)} prompts, {len(done)} already done, {len(pending)} to run", file=sys.stderr)
+
+    with open(output_path, "a") as out:
+        async def on_result(result):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            print(f"line {result['line']}: {result['status']}", file=sys.stderr)
+
+        await BatchRunner(get_default_engine(), concurrency).run(pending, on_result)
+
+def main():
+    parser = argparse.ArgumentParser(description="Improve every prompt in a JSONL file")
+    parser.add_argument("input", help="JSONL file with one PromptRequest per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run_file(args.input, args.output, args.concurrency))
+
+if __name__ == "__main__":
+    main()
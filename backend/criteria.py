@@ -0,0 +1,12 @@
+# Criterion constants and local scores shared by request validation and the engine. Kept free of numpy, which
+# only loads with the scoring module on the first scored job, so models and the batch CLI import quickly.
+
+# Scored locally from the token count instead of by the judge; used by the "compress" objective
+CONCISENESS = "conciseness"
+# Fallback for criteria the judge did not return and for criteria missing from old checkpoints
+NEUTRAL_SCORE = 5
+
+def conciseness_score(tokens: int, baseline_tokens: int) -> int:
+    """10 at half the original length or shorter, 5 at the original length, 1 at 1.4x or longer"""
+    ratio = tokens / max(baseline_tokens, 1)
+    return max(1, min(10, round(15 - 10 * ratio)))
@@ -2,6 +2,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
+from database.search import ensure_search_index
+from database.migrations.initial_migrations import add_missing_columns
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
 
@@ -20,3 +22,9 @@ def get_db():
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine, Base.metadata)
+    # create_all skips tables that already exist, including their new indexes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    ensure_search_index(engine)
@@ -0,0 +1,25 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+def add_missing_columns(engine: Engine, metadata):
+    """Add columns declared on the models but missing from existing tables.
+
+    create_all only creates whole tables, so columns added to an existing model
+    need an ALTER TABLE. New columns must be nullable or carry a server_default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {default}" if hasattr(default, "text") else f" DEFAULT '{default}'"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ForeignKey, Boolean, Text, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database.connections import Base
 import uuid
@@ -21,6 +21,9 @@ class User(Base):
     total_prompts = Column(Integer, default=0)
     total_jobs = Column(Integer, default=0)
 
+    # Plan tier; weights LLM capacity in the fair-share scheduler
+    tier = Column(String, nullable=False, default="free", server_default="free")
+
     prompt_results = relationship("PromptResults", back_populates="user")
 
     def __repr__(self):
@@ -35,9 +38,106 @@ class PromptResults(Base):
     improved_prompt = Column(Text, nullable=False)
     total_iterations = Column(Integer, default=0)
 
+    # Average judge scores of the original and final prompt; null for rows saved before they were recorded
+    initial_score = Column(Float, nullable=True)
+    final_score = Column(Float, nullable=True)
+    tokens_used = Column(Integer, nullable=True)
+
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     user = relationship("User", back_populates="prompt_results")
 
+    __table_args__ = (
+        Index('ix_prompt_results_user_created', 'user_id', 'created_at'),
+        # Lets retention find expired rows across all users without a full scan
+        Index('ix_prompt_results_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<PromptResults(id='{self.id}', user_id='{self.user_id}')>"
+
+class PromptResultArchive(Base):
+    """prompt_results rows past the retention period, with both prompt texts zlib-compressed"""
+    __tablename__ = 'prompt_results_archive'
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey('users.id'), nullable=False, index=True)
+    # The job's prompt_result_id is cleared on archiving, so the link is kept from this side
+    job_id = Column(String, nullable=True)
+
+    original_prompt = Column(LargeBinary, nullable=False)
+    improved_prompt = Column(LargeBinary, nullable=False)
+    total_iterations = Column(Integer, default=0)
+    initial_score = Column(Float, nullable=True)
+    final_score = Column(Float, nullable=True)
+    tokens_used = Column(Integer, nullable=True)
+    # The job's improvement_checkpoints as zlib-compressed JSON; null if archived before checkpoints were moved too
+    trajectory = Column(LargeBinary, nullable=True)
+
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<PromptResultArchive(id='{self.id}', user_id='{self.user_id}')>"
+
+# Job statuses that are still to finish; a process resumes these after a restart
+ACTIVE_STATUSES = ("pending", "running")
+
+class ImprovementJob(Base):
+    __tablename__ = 'improvement_jobs'
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey('users.id'), nullable=False, index=True)
+
+    request = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)
+    error = Column(Text, nullable=True)
+    # Lease of the process running the job; another process may resume it once heartbeat_at goes stale
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    prompt_result_id = Column(String, ForeignKey('prompt_results.id'), nullable=True, index=True)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    completed_at = Column(DateTime, nullable=True)
+
+    checkpoints = relationship("ImprovementCheckpoint", back_populates="job",
+                               order_by="ImprovementCheckpoint.iteration")
+
+    def __repr__(self):
+        return f"<ImprovementJob(id='{self.id}', status='{self.status}')>"
+
+class ImprovementCheckpoint(Base):
+    __tablename__ = 'improvement_checkpoints'
+    job_id = Column(String, ForeignKey('improvement_jobs.id'), primary_key=True)
+    iteration = Column(Integer, primary_key=True)
+
+    prompt = Column(Text, nullable=False)
+    scores = Column(JSON, nullable=False)
+    # Scores the next iteration compares against, from the same judge as its first verdict; null on old rows
+    baseline_scores = Column(JSON, nullable=True)
+    focus_criteria = Column(JSON, nullable=False)
+    improvements_needed = Column(JSON, nullable=False)
+    consecutive_improvements = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    job = relationship("ImprovementJob", back_populates="checkpoints")
+
+    def __repr__(self):
+        return f"<ImprovementCheckpoint(job_id='{self.job_id}', iteration={self.iteration})>"
+
+class UserDailyStats(Base):
+    """Per-user, per-day (UTC) rollup of saved results, incremented as each result is saved"""
+    __tablename__ = 'user_daily_stats'
+    user_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    jobs = Column(Integer, nullable=False, default=0)
+    iterations = Column(Integer, nullable=False, default=0)
+    # Only jobs with both an initial and a final score count towards the score gain
+    scored_jobs = Column(Integer, nullable=False, default=0)
+    score_gain_total = Column(Float, nullable=False, default=0.0)
+    tokens_used = Column(Integer, nullable=False, default=0)
+
     def __repr__(self):
-        return f"<PromptResults(id='{self.id}', user_id='{self.user_id}')>"
\ No newline at end of file
+        return f"<UserDailyStats(user_id='{self.user_id}', day='{self.day}')>"
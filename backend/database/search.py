@@ -0,0 +1,78 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+import re
+
+# SQLite: external-content FTS5 table over prompt_results, kept in sync by
+# triggers. Indexing happens inside the INSERT that save_prompt_result already
+# issues, so no extra round trip is added to the write path.
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS prompt_results_fts USING fts5(
+        original_prompt,
+        improved_prompt,
+        content='prompt_results',
+        content_rowid='rowid',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompt_results_fts_ai AFTER INSERT ON prompt_results BEGIN
+        INSERT INTO prompt_results_fts(rowid, original_prompt, improved_prompt)
+        VALUES (new.rowid, new.original_prompt, new.improved_prompt);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompt_results_fts_ad AFTER DELETE ON prompt_results BEGIN
+        INSERT INTO prompt_results_fts(prompt_results_fts, rowid, original_prompt, improved_prompt)
+        VALUES ('delete', old.rowid, old.original_prompt, old.improved_prompt);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompt_results_fts_au
+    AFTER UPDATE OF original_prompt, improved_prompt ON prompt_results BEGIN
+        INSERT INTO prompt_results_fts(prompt_results_fts, rowid, original_prompt, improved_prompt)
+        VALUES ('delete', old.rowid, old.original_prompt, old.improved_prompt);
+        INSERT INTO prompt_results_fts(rowid, original_prompt, improved_prompt)
+        VALUES (new.rowid, new.original_prompt, new.improved_prompt);
+    END
+    """,
+]
+
+# Postgres: an expression GIN index is maintained by the database itself on
+# every write, so no trigger or extra column is needed.
+POSTGRES_TSVECTOR = "to_tsvector('english', original_prompt || ' ' || improved_prompt)"
+
+POSTGRES_SEARCH_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_prompt_results_search ON prompt_results USING GIN ({POSTGRES_TSVECTOR})",
+]
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+
+def ensure_search_index(engine: Engine):
+    """Create the full-text index for prompt history if it does not exist yet"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='prompt_results_fts'")
+            ).first()
+            for statement in SQLITE_SEARCH_DDL:
+                conn.execute(text(statement))
+            if not existed:
+                # Index rows saved before the FTS table existed
+                conn.execute(text("INSERT INTO prompt_results_fts(prompt_results_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_SEARCH_DDL:
+                conn.execute(text(statement))
+
+
+def build_fts_query(query: str) -> str:
+    """Turn free text into a safe FTS5 MATCH expression (implicit AND, prefix on last term)"""
+    terms = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
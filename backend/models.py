@@ -1,21 +1,66 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, RootModel, field_validator, model_validator
+from typing import List, Optional, Dict, Any, Literal, Union
 from datetime import datetime
+from criteria import CONCISENESS
+import re
+import unicodedata
 
 default_criteria = ["relevance", "coherence", "simplicity", "depth"]
+MAX_CRITERION_LENGTH = 40
+
+def criterion_slug(name: str) -> str:
+    """Lowercase ASCII with every other run of characters as one underscore: "Tone-of-Voice" -> "tone_of_voice" """
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9_]+", "_", ascii_name.lower()).strip("_")[:MAX_CRITERION_LENGTH]
 
 class PromptRequest(BaseModel):
     prompt: str = Field(min_length=10, max_length=5000, description="Prompt text between 10-5000 characters")
-    criteria: Optional[List[str]] = Field(default=default_criteria)
+    criteria: Optional[List[str]] = Field(default=default_criteria, max_length=10, description="Criteria to score and refine; names are slugified, e.g. \"Tone of voice\" becomes tone_of_voice")
+    criteria_weights: Optional[Dict[str, float]] = Field(default=None, description="Relative weight of each criterion in the average; unlisted criteria weigh 1")
     max_iterations: Optional[int] = Field(default=8, ge=1, le=20, description="Number of iterations between 1-20")
     min_consecutive_improvements: Optional[int] = Field(default=2, ge=1, le=5, description="Consecutive improvements between 1-5")
+    stream: Optional[bool] = Field(default=False, description="Stream refinements over GET /job/{job_id}/events as they are generated")
+    objective: Optional[Literal["quality", "compress"]] = Field(default="quality", description="compress also scores conciseness and prefers shorter prompts of equal quality")
+
+    @field_validator("criteria")
+    @classmethod
+    def normalize_criteria(cls, criteria):
+        if criteria is None:
+            return criteria
+        names = []
+        for criterion in criteria:
+            name = criterion_slug(criterion)
+            if not name or name == "average":
+                raise ValueError(f"Invalid criterion name: {criterion!r}")
+            if name not in names:
+                names.append(name)
+        return names
+
+    @field_validator("criteria_weights")
+    @classmethod
+    def normalize_criteria_weights(cls, weights):
+        if weights is None:
+            return weights
+        return {criterion_slug(criterion): weight for criterion, weight in weights.items()}
+
+    @model_validator(mode="after")
+    def check_criteria_weights(self):
+        known = set(self.criteria or default_criteria) | {CONCISENESS}
+        for criterion, weight in (self.criteria_weights or {}).items():
+            if criterion not in known:
+                raise ValueError(f"Weight given for a criterion that is not scored: {criterion!r}")
+            if weight <= 0:
+                raise ValueError(f"Weight of {criterion!r} must be positive")
+        return self
+
+class ScoreResponse(RootModel[Dict[str, Union[int, float]]]):
+    """Score per criterion, plus their weighted "average" """
+
+    def __getitem__(self, key):
+        return self.root[key]
 
-class ScoreResponse(BaseModel):
-    relevance: Optional[int]
-    coherence: Optional[int]
-    simplicity: Optional[int]
-    depth: Optional[int]
-    average: Optional[float]
+    def get(self, key, default=None):
+        return self.root.get(key, default)
 
 class ImprovementIteration(BaseModel):
     iteration: int
@@ -34,6 +79,8 @@ class JobStatus(BaseModel):
     error: Optional[str]
     created_at: datetime
     completed_at: Optional[datetime]
+    metrics: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, Any]] = None
 
 class JobResponse(BaseModel):
     job_id: str
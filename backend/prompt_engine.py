@@ -1,171 +1,612 @@
-import os, json
-from openai import AsyncOpenAI
+import os, json, copy, contextlib, functools
+from types import SimpleNamespace
+from collections import OrderedDict
 from dotenv import load_dotenv
 from models import ScoreResponse, ImprovementIteration
+from scheduler import create_scheduler_from_env
+from streaming import PartialFieldParser
+from tokens import count_tokens, count_request_tokens, model_limits, PromptTooLongError
+from tracing import span, start_span
+from criteria import CONCISENESS, NEUTRAL_SCORE, conciseness_score
 from datetime import datetime
 
 load_dotenv()
 
+TOKEN_KEYS = ("prompt_tokens", "completion_tokens")
+
+# Output budgets, in tokens
+MIN_OUTPUT_TOKENS = 300
+TOOL_CALL_OVERHEAD_TOKENS = 100
+SCORE_BASE_TOKENS = 64
+SCORE_TOKENS_PER_CRITERION = 16
+
+REFINE_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "refine_prompt",
+            "description": "Return a cleaned-up prompt plus stats",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "refined_prompt": {"type": "string"},
+                    "token_count": {"type": "integer"},
+                    "keywords_added": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    },
+                },
+                "required": ["refined_prompt"]
+            }
+        }
+    }
+]
+
+class TruncatedOutputError(Exception):
+    """The model kept hitting max_tokens even after the budget was raised"""
+
+class RefinementError(Exception):
+    """Every refinement of a job failed, so there is no improved prompt to return"""
+
 class PromptEngine:
     def __init__(self, 
                  api_key: str = None,
                  model: str = "gpt-4o-mini",
                  default_criteria: list = None,
-                 max_iterations: int = 3):
-        self.client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+                 max_iterations: int = 3,
+                 scheduler=None,
+                 judge_model: str = None,
+                 cheap_judge_model: str = None,
+                 escalation_margin: float = 0.5,
+                 incremental_scoring: bool = False,
+                 full_rescore_interval: int = 3,
+                 score_cache_size: int = 0):
+        self.api_key = api_key
+        self._client = None
         self.model = model
+        # Scoring cascade: judge with cheap_judge_model first and only call judge_model
+        # when the cheap verdict is too close to call. Disabled when cheap_judge_model is None.
+        self.judge_model = judge_model or model
+        self.cheap_judge_model = cheap_judge_model
+        self.escalation_margin = escalation_margin
+        # Incremental scoring: after the first iteration re-score only the focus criteria plus
+        # one control criterion, with a full re-score every full_rescore_interval iterations and at the end
+        self.incremental_scoring = incremental_scoring
+        self.full_rescore_interval = full_rescore_interval
+        self._score_tool_cache = {}
+        # LRU of judge verdicts by (model, criteria, prompt), shared by every job on this engine
+        self.score_cache_size = score_cache_size
+        self._score_cache = OrderedDict()
         self.max_iterations = max_iterations
         self.default_criteria = default_criteria or ["relevance", "coherence", "simplicity", "depth"]
+        self.scheduler = scheduler
     
-    async def score_prompt(self, prompt):
-        instructions = f"""
-        Evaluate the following prompt based on the criteria {', '.join(self.default_criteria)}.
-        Provide a score for each factor on a scale from 1 to 10 and calculate a final average.
+    @property
+    def client(self):
+        # openai is the heaviest import in the backend, so defer it until the first call
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key or os.getenv("OPENAI_API_KEY"))
+        return self._client
 
-        Prompt: "{prompt}"
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def is_warm(self) -> bool:
+        return self._client is not None
+
+    def _slot(self):
+        return self.scheduler.slot() if self.scheduler else contextlib.nullcontext()
+
+    async def _complete(self, on_arguments=None, **kwargs):
+        """Make one chat completion call, waiting for a fair-share slot if a scheduler is set.
+
+        With on_arguments the call is streamed: on_arguments(None) marks the start of the
+        stream, then each tool-call arguments delta is passed to it as it arrives. The chunks
+        are reassembled into the same shape as a non-streamed response.
         """
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "score_prompt",
-                    "description": "Score a prompt on several criteria",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            criterion: {"type": "integer", "minimum": 1, "maximum": 10}
-                            for criterion in self.default_criteria
-                        } | {"average": {"type": "number"}},
-                        "required": self.default_criteria + ["average"]
+        waiting = start_span("queue_wait")
+        async with self._slot():
+            waiting.end()
+            with span("llm_call", model=kwargs["model"], max_tokens=kwargs.get("max_tokens"),
+                      streamed=on_arguments is not None) as call:
+                if on_arguments is None:
+                    response = await self.client.chat.completions.create(**kwargs)
+                else:
+                    response = await self._complete_streamed(on_arguments, **kwargs)
+                usage = getattr(response, "usage", None)
+                call.set_attributes(
+                    finish_reason=response.choices[0].finish_reason,
+                    prompt_tokens=usage.prompt_tokens if usage else None,
+                    completion_tokens=usage.completion_tokens if usage else None
+                )
+        return response
+
+    async def _complete_streamed(self, on_arguments, **kwargs):
+        stream = await self.client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        await on_arguments(None)
+        arguments, finish_reason, usage = [], None, None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            for tool_call in choice.delta.tool_calls or []:
+                if tool_call.function and tool_call.function.arguments:
+                    arguments.append(tool_call.function.arguments)
+                    await on_arguments(tool_call.function.arguments)
+
+        function = SimpleNamespace(name=kwargs["tool_choice"]["function"]["name"], arguments="".join(arguments))
+        message = SimpleNamespace(tool_calls=[SimpleNamespace(function=function)])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+    async def _complete_within_budget(self, max_tokens, metrics, on_arguments=None, **kwargs):
+        """Call the model, retrying once with twice the output budget if it stops at max_tokens"""
+        _, max_output = model_limits(kwargs["model"])
+        for attempt in range(2):
+            response = await self._complete(on_arguments, max_tokens=max_tokens, **kwargs)
+            self._record_usage(response, metrics)
+            if response.choices[0].finish_reason != "length":
+                return response
+            self._record_truncation(metrics)
+            if attempt == 1 or max_tokens >= max_output:
+                break
+            max_tokens = min(max_tokens * 2, max_output)
+        raise TruncatedOutputError(f"Output still truncated at max_tokens={max_tokens}")
+
+    def _record_usage(self, response, metrics):
+        if metrics is None:
+            return
+        metrics["llm_calls"] = metrics.get("llm_calls", 0) + 1
+        metrics["truncation_rate"] = round(metrics.get("truncations", 0) / metrics["llm_calls"], 3)
+        if not getattr(response, "usage", None):
+            return
+        metrics["prompt_tokens"] = metrics.get("prompt_tokens", 0) + response.usage.prompt_tokens
+        metrics["completion_tokens"] = metrics.get("completion_tokens", 0) + response.usage.completion_tokens
+
+    def _record_refine_failure(self, metrics, error):
+        if metrics is None:
+            return
+        metrics["refine_failures"] = metrics.get("refine_failures", 0) + 1
+        metrics["last_refine_error"] = str(error)
+
+    def _record_truncation(self, metrics):
+        if metrics is None:
+            return
+        metrics["truncations"] = metrics.get("truncations", 0) + 1
+        metrics["truncation_rate"] = round(metrics["truncations"] / metrics["llm_calls"], 3)
+
+    def _score_tools(self, criteria: tuple):
+        """Tool schema for scoring a criteria set, built once per distinct set"""
+        tools = self._score_tool_cache.get(criteria)
+        if tools is None:
+            tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": "score_prompt",
+                        "description": "Score a prompt on several criteria",
+                        "parameters": {
+                            "type": "object",
+                            "properties": {
+                                criterion: {"type": "integer", "minimum": 1, "maximum": 10}
+                                for criterion in criteria
+                            },
+                            "required": list(criteria)
+                        }
                     }
                 }
-            }
-        ]
+            ]
+            self._score_tool_cache[criteria] = tools
+        return tools
+
+    async def score_prompt(self, prompt, metrics=None, model=None, criteria=None, baseline_tokens=None):
+        """Score a prompt on `criteria` (default: the engine's default criteria) as {criterion: score}.
+
+        Conciseness is scored without the judge, relative to `baseline_tokens`.
+        """
+        criteria = tuple(criteria or self.default_criteria)
+        local_scores = {}
+        if CONCISENESS in criteria:
+            local_scores[CONCISENESS] = conciseness_score(count_tokens(prompt, self.model), baseline_tokens)
+            criteria = tuple(criterion for criterion in criteria if criterion != CONCISENESS)
+        if not criteria:
+            return local_scores
+        return await self._judge_scores(prompt, metrics, model, criteria) | local_scores
+
+    async def _judge_scores(self, prompt, metrics, model, criteria):
+        model = model or self.judge_model
+        cache_key = (model, criteria, prompt)
+        if cache_key in self._score_cache:
+            self._score_cache.move_to_end(cache_key)
+            if metrics is not None:
+                metrics["score_cache_hits"] = metrics.get("score_cache_hits", 0) + 1
+            return dict(self._score_cache[cache_key])
+
+        instructions = f"""
+        Evaluate the following prompt based on the criteria {', '.join(criteria)}.
+        Provide a score for each factor on a scale from 1 to 10.
+
+        Prompt: "{prompt}"
+        """
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an AI evaluator tasked with scoring prompts based on certain criteria, that returns scores in JSON format"},
-                    {"role": "user", "content": instructions}, 
-                ],
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "score_prompt"}},
-                max_tokens=300
-            )
+            with span("score", model=model, criteria=len(criteria)):
+                response = await self._complete_within_budget(
+                    SCORE_BASE_TOKENS + SCORE_TOKENS_PER_CRITERION * len(criteria),
+                    metrics,
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are an AI evaluator tasked with scoring prompts based on certain criteria, that returns scores in JSON format"},
+                        {"role": "user", "content": instructions}, 
+                    ],
+                    tools=self._score_tools(criteria),
+                    tool_choice={"type": "function", "function": {"name": "score_prompt"}}
+                )
 
-            tool_call = response.choices[0].message.tool_calls[0]
-            args = tool_call.function.arguments
-            return json.loads(args)
+            with span("parse"):
+                tool_call = response.choices[0].message.tool_calls[0]
+                args = json.loads(tool_call.function.arguments)
+                scores = {criterion: args[criterion] for criterion in criteria}
+            if self.score_cache_size:
+                self._score_cache[cache_key] = scores
+                if len(self._score_cache) > self.score_cache_size:
+                    self._score_cache.popitem(last=False)
+            return dict(scores)
         
         except Exception as e:
-            return {criterion: 5 for criterion in self.default_criteria} | {"average": 5.0}
-
-    async def generate_response(self, prompt, criteria):
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "refine_prompt",
-                    "description": "Return a cleaned-up prompt plus stats",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "refined_prompt": {"type": "string"},
-                            "token_count": {"type": "integer"},
-                            "keywords_added": {
-                                "type": "array",
-                                "items": {"type": "string"}
-                            },
-                        },
-                        "required": ["refined_prompt"]
-                    }
-                }
-            }
-        ]
+            return {criterion: NEUTRAL_SCORE for criterion in criteria}
+
+    def criteria_set(self, criteria=None, weights=None):
+        """The CriteriaSet for `criteria` (default: the engine's default criteria) weighted by {criterion: weight}"""
+        # numpy comes in with scoring, so it loads on the first scored job instead of at startup
+        from scoring import get_criteria_set
+        names = tuple(criteria or self.default_criteria)
+        weights = weights or {}
+        return get_criteria_set(names, tuple(float(weights.get(name, 1.0)) for name in names))
+
+    def _criteria_to_score(self, criteria_set, focus_criteria, iteration):
+        """Criteria to re-score this iteration, or None for a full re-score"""
+        if not self.incremental_scoring or iteration % self.full_rescore_interval == 0:
+            return None
+        judged = [criterion for criterion in criteria_set.names if criterion != CONCISENESS]
+        focus = [criterion for criterion in judged if criterion in focus_criteria]
+        others = [criterion for criterion in judged if criterion not in focus_criteria]
+        if not others:
+            return None
+        # One rotating control criterion catches regressions outside the focus set
+        return focus + [others[iteration % len(others)]]
+
+    async def _judge(self, prompt, metrics, model, criteria_set, criteria, previous_scores, baseline_tokens):
+        scores = await self.score_prompt(prompt, metrics, model=model, criteria=criteria or criteria_set.names,
+                                         baseline_tokens=baseline_tokens)
+        # Criteria that were not re-scored this time are carried forward
+        return criteria_set.vector(scores, previous_scores if criteria else None)
+
+    def _needs_escalation(self, criteria_set, previous_scores, cheap_scores, trend):
+        delta = float(criteria_set.average(cheap_scores) - criteria_set.average(previous_scores))
+        # Regressions that barely move the average decide find_improvement's verdict and could be judge noise;
+        # steady scores with no regression are taken as they are
+        if abs(delta) <= self.escalation_margin:
+            return bool(criteria_set.regressions(previous_scores, cheap_scores).any())
+        # The cheap judge says the opposite of where the last few iterations were heading
+        return trend * delta < 0
+
+    async def score_candidate(self, prompt, previous_scores=None, metrics=None, trend=0.0, criteria=None,
+                              baseline_tokens=None, criteria_set=None, previous_prompt=None):
+        """Score a prompt through the judge cascade, escalating to the strong judge near the decision boundary.
+
+        Returns (scores, (previous, current)) as vectors for `criteria_set` (default: the engine's default
+        criteria). `scores` come from the same judge as `previous_scores`, so the next candidate is compared
+        against them. The pair is what this candidate is judged on: `previous_scores` and `scores`, or after an
+        escalation both `previous_prompt` and `prompt` re-scored by the strong judge, so a judge is never
+        compared against another judge's numbers.
 
+        With `criteria`, only those are re-scored and the rest are carried forward from `previous_scores`.
+        Conciseness, when in the set, is scored against `baseline_tokens`.
+        """
+        criteria_set = criteria_set or self.criteria_set()
+        metrics = metrics if metrics is not None else {}
+        judge_calls = metrics.setdefault("judge_calls", {"cheap": 0, "strong": 0})
+        metrics.setdefault("escalations", 0)
+        metrics.setdefault("criteria_scored", 0)
+        if previous_scores is None:
+            criteria = None
+        if criteria is not None and CONCISENESS in criteria_set.index and CONCISENESS not in criteria:
+            # Free to score, so never carried forward
+            criteria = criteria + [CONCISENESS]
+        metrics["criteria_scored"] += len(criteria or criteria_set.names)
+
+        if not self.cheap_judge_model:
+            judge_calls["strong"] += 1
+            scores = await self._judge(prompt, metrics, self.judge_model, criteria_set, criteria, previous_scores,
+                                       baseline_tokens)
+            return scores, (previous_scores, scores)
+
+        judge_calls["cheap"] += 1
+        scores = await self._judge(prompt, metrics, self.cheap_judge_model, criteria_set, criteria, previous_scores,
+                                   baseline_tokens)
+        verdict = (previous_scores, scores)
+        if (previous_scores is not None and previous_prompt is not None
+                and self._needs_escalation(criteria_set, previous_scores, scores, trend)):
+            # Unscored criteria are carried forward from the same scores for both, so they never differ
+            judge_calls["strong"] += 2
+            metrics["escalations"] += 1
+            verdict = (
+                await self._judge(previous_prompt, metrics, self.judge_model, criteria_set, criteria, previous_scores,
+                                  baseline_tokens),
+                await self._judge(prompt, metrics, self.judge_model, criteria_set, criteria, previous_scores,
+                                  baseline_tokens)
+            )
+        metrics["escalation_rate"] = round(metrics["escalations"] / judge_calls["cheap"], 3)
+        return scores, verdict
+
+    def _refine_messages(self, prompt, criteria):
         criteria_text = ", ".join(criteria)
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an AI that helps improve prompts."},
-                    {"role": "user", "content": f"Please refine this prompt: {prompt}. Make this prompt better by refining the {criteria_text} of the prompt"}
-                ],
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "refine_prompt"}}, 
-                max_tokens=300
+        return [
+            {"role": "system", "content": "You are an AI that helps improve prompts."},
+            {"role": "user", "content": f"Please refine this prompt: {prompt}. Make this prompt better by refining the {criteria_text} of the prompt"}
+        ]
+
+    def refine_budget(self, prompt, criteria) -> int:
+        """max_tokens for refining `prompt`, sized from its length; raises PromptTooLongError if it cannot fit"""
+        context_window, max_output = model_limits(self.model)
+        prompt_tokens = count_tokens(prompt, self.model)
+        input_tokens = count_request_tokens(self.model, self._refine_messages(prompt, criteria), REFINE_TOOLS)
+        # Room to at least restate the prompt inside the tool call arguments
+        needed = prompt_tokens + TOOL_CALL_OVERHEAD_TOKENS
+        available = context_window - input_tokens
+        if needed > min(available, max_output):
+            raise PromptTooLongError(
+                f"Prompt is ~{prompt_tokens} tokens; {self.model} cannot fit it and its refinement"
             )
+        # JSON escaping plus the usual growth of a refined prompt
+        wanted = max(MIN_OUTPUT_TOKENS, 2 * prompt_tokens + TOOL_CALL_OVERHEAD_TOKENS)
+        return min(wanted, max_output, available)
+
+    def _refinement_stream(self, on_refinement):
+        """Turn raw arguments deltas into refined-prompt text deltas for on_refinement"""
+        state = {"parser": None}
 
-            tool_call = response.choices[0].message.tool_calls[0]
-            args_json = tool_call.function.arguments
-            data = json.loads(args_json)
+        async def on_arguments(delta):
+            if delta is None:
+                # A new attempt after a truncated one: the client must drop what it has so far
+                if state["parser"] is not None:
+                    await on_refinement({"restart": True})
+                state["parser"] = PartialFieldParser("refined_prompt")
+                return
+            text = state["parser"].feed(delta)
+            if text:
+                await on_refinement({"delta": text})
+
+        return on_arguments
+
+    async def generate_response(self, prompt, criteria, metrics=None, on_refinement=None):
+        """Refine a prompt; with on_refinement, stream the refined text to it while it is generated.
+
+        A failed refinement returns the prompt unchanged and is counted in metrics["refine_failures"].
+        """
+        try:
+            messages = self._refine_messages(prompt, criteria)
+            with span("refine", model=self.model, criteria=len(criteria)):
+                response = await self._complete_within_budget(
+                    self.refine_budget(prompt, criteria),
+                    metrics,
+                    self._refinement_stream(on_refinement) if on_refinement else None,
+                    model=self.model,
+                    messages=messages,
+                    tools=REFINE_TOOLS,
+                    tool_choice={"type": "function", "function": {"name": "refine_prompt"}}
+                )
+
+            with span("parse"):
+                tool_call = response.choices[0].message.tool_calls[0]
+                args_json = tool_call.function.arguments
+                data = json.loads(args_json)
 
             return data["refined_prompt"]
         
         except Exception as e:
+            self._record_refine_failure(metrics, e)
             return prompt
 
-    async def find_improvement(self, d1, d2):
-        res = []
-        for criterion in d1:
-            if criterion == "average":
-                continue
-            old_score, new_score = d1[criterion], d2[criterion]
-            if old_score > new_score:
-                res.append(criterion)
-        return res  
+    def _most_concise_best(self, criteria_set, candidates):
+        """The (prompt, scores) candidate with the best quality scores, preferring fewer tokens on a tie"""
+        quality = criteria_set.quality([scores for _, scores in candidates])
+        tokens = [count_tokens(prompt, self.model) for prompt, _ in candidates]
+        best = max(range(len(candidates)), key=lambda position: (quality[position], -tokens[position]))
+        return candidates[best]
+
+    def find_improvement(self, criteria_set, previous_scores, current_scores):
+        """Criteria the current scores regressed on, i.e. what the next refinement should focus on"""
+        return criteria_set.regressed(previous_scores, current_scores)
+
+    @staticmethod
+    def score_response(criteria_set, scores) -> ScoreResponse:
+        return ScoreResponse(criteria_set.to_dict(scores))
+
+    async def improve_prompt(self, request, progress_callback=None, checkpoint_callback=None, resume_from=None,
+                             refinement_callback=None):
+        """Run the refine/score loop, optionally checkpointing each iteration and resuming from a checkpoint.
+
+        refinement_callback(iteration, event) receives the refined prompt text as it streams in.
+        """
+        def streamed(iteration):
+            if refinement_callback is None:
+                return None
+            return functools.partial(refinement_callback, iteration)
 
-    async def improve_prompt(self, request, progress_callback=None):
         try:
             improvement_history = []
-            initial_scores = await self.score_prompt(request.prompt)
-            
-            improved_prompt = await self.generate_response(request.prompt, request.criteria)
-            scores = await self.score_prompt(improved_prompt) 
-            to_improve = await self.find_improvement(initial_scores, scores)
+            metrics = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0, "truncations": 0,
+                       "refine_failures": 0}
+            refinements = 0
+            trend = 0.0
+
+            # The request's criteria are both scored and refined; compress adds conciseness to them
+            baseline_tokens = None
+            focus_criteria = list(request.criteria or self.default_criteria)
+            if request.objective == "compress" and CONCISENESS not in focus_criteria:
+                focus_criteria = focus_criteria + [CONCISENESS]
+            # Conciseness is scored against the original length, whichever objective asked for it
+            if CONCISENESS in focus_criteria:
+                baseline_tokens = count_tokens(request.prompt, self.model)
+            criteria_set = self.criteria_set(focus_criteria, request.criteria_weights)
 
-            total_iters = 0
-            consecutive_improvements = 0
+            # Fail fast instead of paying for calls whose output cannot fit
+            self.refine_budget(request.prompt, focus_criteria)
 
+            if resume_from:
+                improved_prompt = resume_from["prompt"]
+                # Checkpoints saved before baseline_scores existed had no escalations to tell apart
+                scores = criteria_set.vector(resume_from.get("baseline_scores") or resume_from["scores"])
+                to_improve = resume_from["improvements_needed"]
+                total_iters = resume_from["iteration"]
+                consecutive_improvements = resume_from["consecutive_improvements"]
+                candidates = [(improved_prompt, scores)]
+                initial_scores = None
+            else:
+                initial_scores, _ = await self.score_candidate(request.prompt, None, metrics,
+                                                               baseline_tokens=baseline_tokens, criteria_set=criteria_set)
+
+                improved_prompt = await self.generate_response(request.prompt, focus_criteria, metrics, streamed(0))
+                refinements += 1
+                if metrics["refine_failures"]:
+                    # The input prompt came back unchanged; its scores are already known
+                    scores, to_improve = initial_scores, []
+                    candidates = [(request.prompt, initial_scores)]
+                else:
+                    scores, (compared, judged) = await self.score_candidate(
+                        improved_prompt, initial_scores, metrics, baseline_tokens=baseline_tokens,
+                        criteria_set=criteria_set, previous_prompt=request.prompt)
+                    to_improve = self.find_improvement(criteria_set, compared, judged)
+                    trend = float(criteria_set.average(judged) - criteria_set.average(compared))
+                    candidates = [(request.prompt, initial_scores), (improved_prompt, scores)]
+
+                total_iters = 0
+                consecutive_improvements = 0
+
+                # Iteration 0 holds the warm-up refinement so a restart does not pay for it again
+                if checkpoint_callback:
+                    await checkpoint_callback({
+                        "iteration": 0,
+                        "prompt": improved_prompt,
+                        "scores": criteria_set.to_dict(scores),
+                        "baseline_scores": criteria_set.to_dict(scores),
+                        "focus_criteria": focus_criteria,
+                        "improvements_needed": to_improve,
+                        "consecutive_improvements": 0,
+                        "usage": {key: metrics[key] for key in TOKEN_KEYS},
+                    })
+
+            async def report(iteration, focus_criteria, usage, baseline_scores):
+                if checkpoint_callback:
+                    with span("callback", callback="checkpoint"):
+                        await checkpoint_callback({
+                            "iteration": iteration.iteration,
+                            "prompt": iteration.prompt,
+                            "scores": iteration.scores.model_dump(),
+                            # The cheap judge's scores the next candidate is compared against; after an
+                            # escalation `scores` are the strong judge's
+                            "baseline_scores": criteria_set.to_dict(baseline_scores),
+                            "focus_criteria": focus_criteria,
+                            "improvements_needed": iteration.improvements_needed,
+                            "consecutive_improvements": consecutive_improvements,
+                            "usage": usage,
+                        })
+
+                # Update progress if callback provided
+                if progress_callback:
+                    with span("callback", callback="progress"):
+                        await progress_callback({
+                            "iteration": iteration.iteration,
+                            "prompt": iteration.prompt,
+                            "scores": iteration.scores.model_dump(),
+                            "improvements_needed": iteration.improvements_needed,
+                            "timestamp": datetime.now(),
+                            "metrics": copy.deepcopy(metrics)
+                        })
+
+            scored_partially = False
             while consecutive_improvements < request.min_consecutive_improvements and total_iters < request.max_iterations:
-                criteria_to_focus = to_improve if to_improve else request.criteria
-                improved_prompt = await self.generate_response(improved_prompt, criteria_to_focus)
-                current_scores = await self.score_prompt(improved_prompt)  
-                to_improve = await self.find_improvement(scores, current_scores)
+                usage_before = {key: metrics[key] for key in TOKEN_KEYS}
+                criteria_to_focus = to_improve if to_improve else focus_criteria
+                previous_prompt = improved_prompt
+                failures_before = metrics["refine_failures"]
+                improved_prompt = await self.generate_response(improved_prompt, criteria_to_focus, metrics,
+                                                               streamed(total_iters + 1))
+                refinements += 1
+                if metrics["refine_failures"] > failures_before:
+                    # Nothing new to score: the iteration is used up, but neither resets nor adds to convergence
+                    total_iters += 1
+                    continue
+                criteria_to_score = self._criteria_to_score(criteria_set, criteria_to_focus, total_iters + 1)
+                scored_partially = criteria_to_score is not None
+                current_scores, (compared, judged) = await self.score_candidate(
+                    improved_prompt, scores, metrics, trend, criteria_to_score, baseline_tokens, criteria_set,
+                    previous_prompt)
+                candidates.append((improved_prompt, current_scores))
+                to_improve = self.find_improvement(criteria_set, compared, judged)
+                trend = float(criteria_set.average(judged) - criteria_set.average(compared))
 
                 iteration = ImprovementIteration(
                     iteration=total_iters + 1,
                     prompt=improved_prompt,
-                    scores=ScoreResponse(**current_scores),
+                    scores=self.score_response(criteria_set, judged),
                     improvements_needed=to_improve,
                     timestamp=datetime.now()
                 )
                 improvement_history.append(iteration)
 
-                # Update progress if callback provided
-                if progress_callback:
-                    await progress_callback({
-                        "iteration": total_iters + 1,
-                        "prompt": improved_prompt,
-                        "scores": current_scores,
-                        "improvements_needed": to_improve,
-                        "timestamp": datetime.now()
-                    })
-
                 # Check if we made improvements (no areas need improvement)
                 if len(to_improve) == 0:
                     consecutive_improvements += 1
                 else:
                     consecutive_improvements = 0
 
+                iteration_usage = {key: metrics[key] - usage_before[key] for key in TOKEN_KEYS}
+                await report(iteration, criteria_to_focus, iteration_usage, current_scores)
+
                 scores = current_scores
                 total_iters += 1
 
+            # Handing back the input prompt as "completed" would hide that nothing was refined
+            if refinements and metrics["refine_failures"] == refinements:
+                raise RefinementError(f"Every refinement failed: {metrics['last_refine_error']}")
+
+            # Never hand back carried-forward scores for the final prompt
+            if scored_partially:
+                usage_before = {key: metrics[key] for key in TOKEN_KEYS}
+                scores, _ = await self.score_candidate(improved_prompt, None, metrics, baseline_tokens=baseline_tokens,
+                                                       criteria_set=criteria_set)
+                candidates[-1] = (improved_prompt, scores)
+                final_iteration = improvement_history[-1]
+                final_iteration.scores = self.score_response(criteria_set, scores)
+                usage = {key: iteration_usage[key] + metrics[key] - usage_before[key] for key in TOKEN_KEYS}
+                await report(final_iteration, criteria_to_focus, usage, scores)
+
+            final_prompt, final_scores = improved_prompt, scores
+            if request.objective == "compress":
+                final_prompt, final_scores = self._most_concise_best(criteria_set, candidates)
+                metrics["original_tokens"] = baseline_tokens
+                metrics["final_tokens"] = count_tokens(final_prompt, self.model)
+                metrics["tokens_saved"] = baseline_tokens - metrics["final_tokens"]
+
             return {
                 "status": "completed",
-                "final_prompt": improved_prompt,
+                "final_prompt": final_prompt,
                 "iterations": improvement_history,
+                "total_iterations": total_iters,
+                # Initial scores are unknown when resuming from a checkpoint
+                "initial_scores": criteria_set.to_dict(initial_scores) if initial_scores is not None else None,
+                "final_scores": criteria_set.to_dict(final_scores),
+                "metrics": metrics,
                 "error": None,
             }
         
@@ -174,6 +615,8 @@ class PromptEngine:
                 "status": "failed",
                 "final_prompt": None,
                 "iterations": improvement_history if 'improvement_history' in locals() else [],
+                "total_iterations": total_iters if 'total_iters' in locals() else 0,
+                "metrics": metrics if 'metrics' in locals() else {},
                 "error": str(e),
             }
 
@@ -181,8 +624,25 @@ def create_prompt_engine(**kwargs) -> PromptEngine:
     """Create a PromptEngine instance with default settings"""
     return PromptEngine(**kwargs)
 
-default_engine = PromptEngine()
+_default_engine = None
+
+def get_default_engine() -> PromptEngine:
+    """Return the shared PromptEngine, constructing it on first use"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = PromptEngine(
+            scheduler=create_scheduler_from_env(),
+            judge_model=os.getenv("JUDGE_MODEL"),
+            cheap_judge_model=os.getenv("CHEAP_JUDGE_MODEL"),
+            escalation_margin=float(os.getenv("JUDGE_ESCALATION_MARGIN", "0.5")),
+            incremental_scoring=os.getenv("INCREMENTAL_SCORING", "false").lower() == "true",
+            full_rescore_interval=int(os.getenv("FULL_RESCORE_INTERVAL", "3")),
+            score_cache_size=int(os.getenv("SCORE_CACHE_SIZE", "1024"))
+        )
+    return _default_engine
 
-async def improve_prompt(request, progress_callback=None):
+async def improve_prompt(request, progress_callback=None, checkpoint_callback=None, resume_from=None,
+                         refinement_callback=None):
     """Backward-compatible wrapper for the main improve_prompt function"""
-    return await default_engine.improve_prompt(request, progress_callback)
\ No newline at end of file
+    return await get_default_engine().improve_prompt(request, progress_callback, checkpoint_callback, resume_from,
+                                                     refinement_callback)
\ No newline at end of file
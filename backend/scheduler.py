@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+# (user_id, tier) of the job whose LLM calls are currently being made.
+# Set once per job by the caller; asyncio tasks inherit it automatically.
+current_tenant = contextvars.ContextVar("current_tenant", default=(None, "free"))
+
+DEFAULT_TIER_WEIGHTS = {"free": 1.0, "pro": 4.0}
+# Weight of the newest call in the moving average of call latency
+LATENCY_SMOOTHING = 0.2
+
+def parse_tier_weights(value: str) -> dict:
+    """Parse "free=1,pro=4" into {"free": 1.0, "pro": 4.0}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        tier, weight = item.split("=")
+        weights[tier.strip()] = float(weight)
+    return weights
+
+class FairScheduler:
+    """Weighted fair queuing of LLM calls across users.
+
+    At most `capacity` calls run at once. When calls have to wait, they are
+    released in start-time fair queuing order: each user's call gets a virtual
+    start tag of max(virtual time, user's previous finish tag) and advances the
+    user's finish tag by cost / weight, so a user with many queued calls only
+    gets their weighted share while other users are waiting.
+    """
+
+    def __init__(self, capacity: int, tier_weights: dict = None):
+        self.capacity = capacity
+        self.tier_weights = tier_weights or DEFAULT_TIER_WEIGHTS
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+        self.waiting = []
+        self._order = itertools.count()
+        # Exponentially weighted mean seconds a call holds its slot; None until the first call
+        self.call_seconds = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self.waiting if not future.cancelled())
+
+    def _tag(self, user_id, tier, cost: float) -> float:
+        weight = self.tier_weights.get(tier, 1.0)
+        start = max(self.virtual_time, self.finish_tags.get(user_id, 0.0))
+        self.finish_tags[user_id] = start + cost / weight
+        return start
+
+    async def acquire(self, user_id=None, tier="free", cost: float = 1.0):
+        start = self._tag(user_id, tier, cost)
+        if self.in_flight < self.capacity and not self.waiting:
+            self.in_flight += 1
+            self.virtual_time = start
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (start, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot was handed over just before we were cancelled: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        while self.waiting:
+            start, _, future = heapq.heappop(self.waiting)
+            if future.cancelled():
+                continue
+            self.in_flight += 1
+            self.virtual_time = start
+            future.set_result(None)
+            break
+        if not self.waiting and self.in_flight == 0:
+            # Idle: drop per-user tags so the table does not grow with every user ever seen
+            self.finish_tags.clear()
+            self.virtual_time = 0.0
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 1.0):
+        """Hold one LLM call slot for the tenant in `current_tenant`"""
+        user_id, tier = current_tenant.get()
+        await self.acquire(user_id, tier, cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release()
+            self._observe(time.monotonic() - started)
+
+    def _observe(self, seconds: float):
+        if self.call_seconds is None:
+            self.call_seconds = seconds
+        else:
+            self.call_seconds += LATENCY_SMOOTHING * (seconds - self.call_seconds)
+
+def create_scheduler_from_env():
+    capacity = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    weights = os.getenv("LLM_TIER_WEIGHTS")
+    return FairScheduler(capacity, parse_tier_weights(weights) if weights else None)
@@ -0,0 +1,53 @@
+from functools import lru_cache
+import numpy as np
+from criteria import CONCISENESS, NEUTRAL_SCORE
+
+class CriteriaSet:
+    """A fixed order of criteria and their weights.
+
+    Scores for a set are float arrays in that order, and the scores of several
+    candidates stack into a (candidates, criteria) matrix, so weighted averages
+    and regressions for a whole iteration are computed in one numpy operation.
+    """
+
+    def __init__(self, names: tuple, weights: tuple):
+        self.names = names
+        self.index = {name: position for position, name in enumerate(names)}
+        self.weights = np.asarray(weights, dtype=float)
+        self._normalized = self.weights / self.weights.sum()
+        quality = np.where([name == CONCISENESS for name in names], 0.0, self.weights)
+        self._quality = quality / quality.sum() if quality.sum() else self._normalized
+
+    def vector(self, scores: dict, previous: np.ndarray = None) -> np.ndarray:
+        """Scores from a {criterion: score} map; criteria it lacks come from `previous` or are neutral"""
+        vector = previous.copy() if previous is not None else np.full(len(self.names), float(NEUTRAL_SCORE))
+        for name, score in scores.items():
+            position = self.index.get(name)
+            if position is not None:
+                vector[position] = score
+        return vector
+
+    def to_dict(self, vector: np.ndarray) -> dict:
+        """{criterion: score, ..., "average": weighted average} for the API and checkpoints"""
+        scores = {name: int(score) for name, score in zip(self.names, vector)}
+        return scores | {"average": float(self.average(vector))}
+
+    def average(self, scores: np.ndarray):
+        """Weighted average of one score vector, or of each row of a score matrix"""
+        return np.round(scores @ self._normalized, 2)
+
+    def quality(self, scores):
+        """Weighted average leaving out conciseness, of a score vector or a sequence of them"""
+        return np.round(np.asarray(scores) @ self._quality, 2)
+
+    def regressions(self, previous: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Boolean (candidates, criteria) matrix of criteria each candidate scores lower on than `previous`"""
+        return np.atleast_2d(candidates) < previous
+
+    def regressed(self, previous: np.ndarray, candidate: np.ndarray) -> list:
+        return [self.names[position] for position in np.flatnonzero(self.regressions(previous, candidate)[0])]
+
+@lru_cache(maxsize=256)
+def get_criteria_set(names: tuple, weights: tuple = None) -> CriteriaSet:
+    """The shared CriteriaSet for these criteria and weights (all 1 by default)"""
+    return CriteriaSet(names, weights or (1.0,) * len(names))
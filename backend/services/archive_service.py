@@ -0,0 +1,129 @@
+from sqlalchemy.orm import Session
+from database.models import PromptResults, PromptResultArchive, ImprovementJob, ImprovementCheckpoint, ACTIVE_STATUSES
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+import json
+import zlib
+
+CHECKPOINT_FIELDS = ("iteration", "prompt", "scores", "baseline_scores", "focus_criteria", "improvements_needed",
+                     "consecutive_improvements", "prompt_tokens", "completion_tokens")
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+def decompress_text(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+def compress_checkpoints(checkpoints) -> bytes:
+    rows = [{field: getattr(checkpoint, field) for field in CHECKPOINT_FIELDS}
+            | {"created_at": checkpoint.created_at.isoformat() if checkpoint.created_at else None}
+            for checkpoint in checkpoints]
+    return compress_text(json.dumps(rows))
+
+def decompress_checkpoints(job_id: str, blob: bytes) -> list:
+    """Archived checkpoints as ImprovementCheckpoints that are not attached to the session"""
+    return [
+        ImprovementCheckpoint(job_id=job_id, **{field: row.get(field) for field in CHECKPOINT_FIELDS},
+                              created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else None)
+        for row in json.loads(decompress_text(blob))
+    ]
+
+class ArchiveService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def archive_batch(self, cutoff: datetime, batch_size: int) -> int:
+        """Move up to batch_size results created before cutoff, and their jobs' checkpoints, into the archive
+        in one short transaction"""
+        rows = (self.db.query(PromptResults)
+                .filter(PromptResults.created_at < cutoff)
+                .order_by(PromptResults.created_at)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        job_ids = dict(self.db.query(ImprovementJob.prompt_result_id, ImprovementJob.id)
+                       .filter(ImprovementJob.prompt_result_id.in_(ids)))
+        checkpoints = defaultdict(list)
+        for checkpoint in (self.db.query(ImprovementCheckpoint)
+                           .filter(ImprovementCheckpoint.job_id.in_(list(job_ids.values())))
+                           .order_by(ImprovementCheckpoint.iteration)):
+            checkpoints[checkpoint.job_id].append(checkpoint)
+        self.db.add_all(
+            PromptResultArchive(
+                id=row.id,
+                user_id=row.user_id,
+                job_id=job_ids.get(row.id),
+                original_prompt=compress_text(row.original_prompt),
+                improved_prompt=compress_text(row.improved_prompt),
+                total_iterations=row.total_iterations,
+                initial_score=row.initial_score,
+                final_score=row.final_score,
+                tokens_used=row.tokens_used,
+                trajectory=compress_checkpoints(checkpoints[job_ids[row.id]]) if row.id in job_ids else None,
+                created_at=row.created_at
+            )
+            for row in rows
+        )
+        (self.db.query(ImprovementCheckpoint)
+         .filter(ImprovementCheckpoint.job_id.in_(list(job_ids.values())))
+         .delete(synchronize_session=False))
+        (self.db.query(ImprovementJob)
+         .filter(ImprovementJob.prompt_result_id.in_(ids))
+         .update({ImprovementJob.prompt_result_id: None}, synchronize_session=False))
+        self.db.query(PromptResults).filter(PromptResults.id.in_(ids)).delete(synchronize_session=False)
+        self.db.commit()
+        return len(rows)
+
+    def purge_jobs(self, cutoff: datetime, batch_size: int) -> int:
+        """Delete up to batch_size finished jobs created before cutoff that no live result links to, with their
+        checkpoints, in one short transaction.
+
+        These are jobs whose result is archived and jobs that never produced one. Checkpoints of results
+        archived before trajectories were archived with them are moved into the archive first.
+        """
+        jobs = (self.db.query(ImprovementJob)
+                .filter(ImprovementJob.created_at < cutoff,
+                        ImprovementJob.status.notin_(ACTIVE_STATUSES),
+                        ImprovementJob.prompt_result_id.is_(None))
+                .order_by(ImprovementJob.created_at)
+                .limit(batch_size)
+                .all())
+        if not jobs:
+            return 0
+
+        job_ids = [job.id for job in jobs]
+        for archived in (self.db.query(PromptResultArchive)
+                         .filter(PromptResultArchive.job_id.in_(job_ids), PromptResultArchive.trajectory.is_(None))):
+            archived.trajectory = compress_checkpoints(self.db.query(ImprovementCheckpoint)
+                                                       .filter(ImprovementCheckpoint.job_id == archived.job_id)
+                                                       .order_by(ImprovementCheckpoint.iteration))
+        self.db.flush()
+        (self.db.query(ImprovementCheckpoint)
+         .filter(ImprovementCheckpoint.job_id.in_(job_ids))
+         .delete(synchronize_session=False))
+        self.db.query(ImprovementJob).filter(ImprovementJob.id.in_(job_ids)).delete(synchronize_session=False)
+        self.db.commit()
+        return len(jobs)
+
+    def get_archived(self, prompt_id: str, user_id: str) -> Optional[PromptResults]:
+        """An archived result, decompressed into a PromptResults that is not attached to the session"""
+        row = (self.db.query(PromptResultArchive)
+               .filter(PromptResultArchive.id == prompt_id, PromptResultArchive.user_id == user_id)
+               .first())
+        if row is None:
+            return None
+        return PromptResults(
+            id=row.id,
+            user_id=row.user_id,
+            original_prompt=decompress_text(row.original_prompt),
+            improved_prompt=decompress_text(row.improved_prompt),
+            total_iterations=row.total_iterations,
+            initial_score=row.initial_score,
+            final_score=row.final_score,
+            tokens_used=row.tokens_used,
+            created_at=row.created_at
+        )
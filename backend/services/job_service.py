@@ -0,0 +1,112 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from database.models import ImprovementJob, ImprovementCheckpoint, PromptResultArchive, ACTIVE_STATUSES
+from services.archive_service import decompress_checkpoints
+from datetime import datetime, timezone
+
+class JobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_job(self, job_id: str, user_id: str, request: dict, owner: str = None) -> ImprovementJob:
+        job = ImprovementJob(id=job_id, user_id=user_id, request=request, status="pending", owner=owner,
+                             heartbeat_at=datetime.now(timezone.utc) if owner else None)
+        self.db.add(job)
+        self.db.commit()
+        return job
+
+    def mark_running(self, job_id: str):
+        job = self.db.get(ImprovementJob, job_id)
+        if job:
+            job.status = "running"
+            self.db.commit()
+
+    def save_checkpoint(self, job_id: str, checkpoint: dict) -> ImprovementCheckpoint:
+        usage = checkpoint.get("usage") or {}
+        row = ImprovementCheckpoint(
+            job_id=job_id,
+            iteration=checkpoint["iteration"],
+            prompt=checkpoint["prompt"],
+            scores=checkpoint["scores"],
+            baseline_scores=checkpoint.get("baseline_scores"),
+            focus_criteria=list(checkpoint["focus_criteria"]),
+            improvements_needed=list(checkpoint["improvements_needed"]),
+            consecutive_improvements=checkpoint["consecutive_improvements"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+        # merge so a resumed run re-saving the same iteration overwrites instead of failing
+        row = self.db.merge(row)
+        self.db.commit()
+        return row
+
+    def finish_job(self, job_id: str, status: str, error: str = None, prompt_result_id: str = None):
+        job = self.db.get(ImprovementJob, job_id)
+        if job:
+            job.status = status
+            job.error = error
+            job.prompt_result_id = prompt_result_id
+            job.completed_at = datetime.now(timezone.utc)
+            self.db.commit()
+
+    def renew_leases(self, owner: str):
+        """Refresh the heartbeat of every unfinished job this owner runs"""
+        (self.db.query(ImprovementJob)
+         .filter(ImprovementJob.owner == owner, ImprovementJob.status.in_(ACTIVE_STATUSES))
+         .update({ImprovementJob.heartbeat_at: datetime.now(timezone.utc)}, synchronize_session=False))
+        self.db.commit()
+
+    def claim_interrupted_jobs(self, owner: str, stale_before: datetime):
+        """Take over unfinished jobs whose lease went stale; only the jobs this owner won are returned.
+
+        Each claim is a conditional UPDATE, so when several processes race for a job exactly one gets it.
+        """
+        stale = or_(ImprovementJob.heartbeat_at.is_(None), ImprovementJob.heartbeat_at < stale_before)
+        candidates = [job_id for (job_id,) in (self.db.query(ImprovementJob.id)
+                                                .filter(ImprovementJob.status.in_(ACTIVE_STATUSES), stale)
+                                                .order_by(ImprovementJob.created_at))]
+        claimed = []
+        for job_id in candidates:
+            won = (self.db.query(ImprovementJob)
+                   .filter(ImprovementJob.id == job_id, ImprovementJob.status.in_(ACTIVE_STATUSES), stale)
+                   .update({ImprovementJob.owner: owner, ImprovementJob.heartbeat_at: datetime.now(timezone.utc)},
+                           synchronize_session=False))
+            self.db.commit()
+            if won:
+                claimed.append(self.db.get(ImprovementJob, job_id))
+        return claimed
+
+    def get_last_checkpoint(self, job_id: str):
+        return (self.db.query(ImprovementCheckpoint)
+                .filter(ImprovementCheckpoint.job_id == job_id)
+                .order_by(ImprovementCheckpoint.iteration.desc())
+                .first())
+
+    def get_trajectory(self, prompt_result_id: str):
+        job = (self.db.query(ImprovementJob)
+               .filter(ImprovementJob.prompt_result_id == prompt_result_id)
+               .first())
+        if job is None:
+            archived = self.db.get(PromptResultArchive, prompt_result_id)
+            if archived and archived.trajectory is not None:
+                return decompress_checkpoints(archived.job_id, archived.trajectory)
+            if archived and archived.job_id:
+                job = self.db.get(ImprovementJob, archived.job_id)
+        return job.checkpoints if job else []
+
+    @staticmethod
+    def checkpoint_to_dict(checkpoint: ImprovementCheckpoint) -> dict:
+        return {
+            "iteration": checkpoint.iteration,
+            "prompt": checkpoint.prompt,
+            "scores": checkpoint.scores,
+            "baseline_scores": checkpoint.baseline_scores,
+            "focus_criteria": checkpoint.focus_criteria,
+            "improvements_needed": checkpoint.improvements_needed,
+            "consecutive_improvements": checkpoint.consecutive_improvements,
+            "usage": {
+                "prompt_tokens": checkpoint.prompt_tokens,
+                "completion_tokens": checkpoint.completion_tokens
+            },
+            "timestamp": checkpoint.created_at
+        }
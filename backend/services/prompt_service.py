@@ -1,46 +1,125 @@
+from sqlalchemy import text, func, DateTime
 from sqlalchemy.orm import Session
 from database.models import User, PromptResults
-from prompt_engine import PromptEngine, improve_prompt
+from database.search import build_fts_query, POSTGRES_TSVECTOR, SNIPPET_START, SNIPPET_END
+from services.stats_service import StatsService
+from services.archive_service import ArchiveService
 from typing import List, Optional
+from datetime import datetime, timezone
 import json
 
+def result_scores(result: dict) -> dict:
+    """save_prompt_result() score and usage arguments from an improve_prompt() result"""
+    initial, final, metrics = result.get("initial_scores"), result.get("final_scores"), result.get("metrics") or {}
+    return {
+        "initial_score": initial.get("average") if initial else None,
+        "final_score": final.get("average") if final else None,
+        "tokens_used": metrics.get("prompt_tokens", 0) + metrics.get("completion_tokens", 0),
+    }
+
 class PromptService:
     def __init__(self, db: Session, user_id: str):
        self.db = db
        self.user_id = user_id
 
-    def save_prompt_result(self, original_prompt: str, improved_prompt: str, total_iterations: int):
+    def save_prompt_result(self, original_prompt: str, improved_prompt: str, total_iterations: int,
+                           initial_score: float = None, final_score: float = None, tokens_used: int = None):
         res = PromptResults(
             user_id=self.user_id,
             original_prompt=original_prompt,
             improved_prompt=improved_prompt,
-            total_iterations=total_iterations
+            total_iterations=total_iterations,
+            initial_score=initial_score,
+            final_score=final_score,
+            tokens_used=tokens_used,
+            created_at=datetime.now(timezone.utc)
         )
         self.db.add(res)
+        StatsService(self.db).record_result(res)
         self.db.commit()
         return res
 
     def get_user_prompt_history(self, limit: int=50):
         return self.db.query(PromptResults).filter(PromptResults.user_id == self.user_id).order_by(PromptResults.created_at.desc()).limit(limit).all()
 
+    def get_history_version(self):
+        """Cheap fingerprint of the user's history: latest row id and row count"""
+        latest = (self.db.query(PromptResults.id)
+                  .filter(PromptResults.user_id == self.user_id)
+                  .order_by(PromptResults.created_at.desc())
+                  .first())
+        count = self.db.query(func.count(PromptResults.id)).filter(PromptResults.user_id == self.user_id).scalar()
+        return (latest.id if latest else None), count
+
+    def search_prompt_history(self, query: str, limit: int = 20, offset: int = 0):
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            match = build_fts_query(query)
+            if not match:
+                return {"results": [], "total": 0}
+            params = {"match": match, "user_id": self.user_id, "limit": limit, "offset": offset}
+            total = self.db.execute(text("""
+                SELECT COUNT(*) FROM prompt_results_fts
+                JOIN prompt_results p ON p.rowid = prompt_results_fts.rowid
+                WHERE prompt_results_fts MATCH :match AND p.user_id = :user_id
+            """), params).scalar()
+            rows = self.db.execute(text(f"""
+                SELECT p.id, p.original_prompt, p.improved_prompt, p.total_iterations, p.created_at,
+                       bm25(prompt_results_fts) AS rank,
+                       snippet(prompt_results_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '...', 16) AS original_snippet,
+                       snippet(prompt_results_fts, 1, '{SNIPPET_START}', '{SNIPPET_END}', '...', 16) AS improved_snippet
+                FROM prompt_results_fts
+                JOIN prompt_results p ON p.rowid = prompt_results_fts.rowid
+                WHERE prompt_results_fts MATCH :match AND p.user_id = :user_id
+                ORDER BY rank
+                LIMIT :limit OFFSET :offset
+            """).columns(created_at=DateTime), params).mappings().all()
+        elif dialect == "postgresql":
+            params = {"query": query, "user_id": self.user_id, "limit": limit, "offset": offset}
+            headline_opts = f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxFragments=1"
+            total = self.db.execute(text(f"""
+                SELECT COUNT(*) FROM prompt_results
+                WHERE user_id = :user_id AND {POSTGRES_TSVECTOR} @@ plainto_tsquery('english', :query)
+            """), params).scalar()
+            rows = self.db.execute(text(f"""
+                SELECT id, original_prompt, improved_prompt, total_iterations, created_at,
+                       -ts_rank({POSTGRES_TSVECTOR}, plainto_tsquery('english', :query)) AS rank,
+                       ts_headline('english', original_prompt, plainto_tsquery('english', :query), '{headline_opts}') AS original_snippet,
+                       ts_headline('english', improved_prompt, plainto_tsquery('english', :query), '{headline_opts}') AS improved_snippet
+                FROM prompt_results
+                WHERE user_id = :user_id AND {POSTGRES_TSVECTOR} @@ plainto_tsquery('english', :query)
+                ORDER BY rank
+                LIMIT :limit OFFSET :offset
+            """).columns(created_at=DateTime), params).mappings().all()
+        else:
+            raise ValueError(f"Full-text search is not supported on {dialect}")
+
+        return {"results": rows, "total": total}
+
     def get_prompt_by_id(self, prompt_id: str):
-        return (self.db.query(PromptResults)
+        prompt = (self.db.query(PromptResults)
               .filter(PromptResults.id == prompt_id,
                      PromptResults.user_id == self.user_id)
               .first())
+        if prompt is None:
+            # Results past the retention period live on in the compressed archive
+            prompt = ArchiveService(self.db).get_archived(prompt_id, self.user_id)
+        return prompt
 
     def delete_prompt(self, prompt_id: str):
         self.db.query(PromptResults.filter(PromptResults.id == prompt_id).delete())
         self.db.commit()
 
     async def improve_and_save_prompt(self, prompt_request: dict):
+        from prompt_engine import improve_prompt
         try:
             result = await improve_prompt(prompt_request)
             if result['status'] == 'completed':
                 prompt_result = self.save_prompt_result(
                     original_prompt=prompt_request['prompt'],
                     improved_prompt=result['final_prompt'],
-                    total_iterations=result['total_iterations']
+                    total_iterations=result['total_iterations'],
+                    **result_scores(result)
                 )
                 return {
                   "status": "completed",
@@ -0,0 +1,76 @@
+from sqlalchemy.orm import Session
+from database.models import User, PromptResults, UserDailyStats
+from datetime import datetime, timedelta, timezone
+
+COUNTERS = ("jobs", "iterations", "scored_jobs", "score_gain_total", "tokens_used")
+
+class StatsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_result(self, result: PromptResults):
+        """Add a saved result to its user's daily rollup; committed together with the result by the caller"""
+        scored = result.initial_score is not None and result.final_score is not None
+        values = {
+            "user_id": result.user_id,
+            "day": result.created_at.date(),
+            "jobs": 1,
+            "iterations": result.total_iterations or 0,
+            "scored_jobs": 1 if scored else 0,
+            "score_gain_total": result.final_score - result.initial_score if scored else 0.0,
+            "tokens_used": result.tokens_used or 0,
+        }
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            # Increment in a single statement so concurrent jobs of one user cannot lose updates
+            statement = insert(UserDailyStats).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=["user_id", "day"],
+                set_={counter: getattr(UserDailyStats, counter) + statement.excluded[counter] for counter in COUNTERS}
+            )
+            self.db.execute(statement)
+            return
+
+        row = self.db.get(UserDailyStats, (values["user_id"], values["day"]))
+        if row is None:
+            self.db.add(UserDailyStats(**values))
+        else:
+            for counter in COUNTERS:
+                setattr(row, counter, getattr(row, counter) + values[counter])
+
+    def get_user_stats(self, user_id: str, days: int = 30) -> dict:
+        """Daily rollups for the last `days` days plus their totals; reads at most `days` rows"""
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        rows = (self.db.query(UserDailyStats)
+                .filter(UserDailyStats.user_id == user_id, UserDailyStats.day >= since)
+                .order_by(UserDailyStats.day)
+                .all())
+
+        totals = {counter: 0 for counter in COUNTERS}
+        for row in rows:
+            for counter in COUNTERS:
+                totals[counter] += getattr(row, counter)
+
+        user = self.db.get(User, user_id)
+        return {
+            "days": [self._summary(row.day.isoformat(), {counter: getattr(row, counter) for counter in COUNTERS})
+                     for row in rows],
+            "totals": self._summary(f"last {days} days", totals),
+            "total_prompts": user.total_prompts if user else 0,
+        }
+
+    @staticmethod
+    def _summary(period: str, counters: dict) -> dict:
+        scored = counters["scored_jobs"]
+        return {
+            "period": period,
+            "jobs": counters["jobs"],
+            "iterations": counters["iterations"],
+            "average_score_gain": round(counters["score_gain_total"] / scored, 2) if scored else None,
+            "tokens_used": counters["tokens_used"],
+        }
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import re
+from collections import defaultdict
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class PartialFieldParser:
+    """Incrementally decode one string field out of streamed JSON tool-call arguments.
+
+    feed() takes the next arguments delta and returns the newly decoded characters of
+    the field's value, so each character is scanned once however the stream is split.
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._in_value = False
+        self._done = False
+        self._escape = ""
+
+    def feed(self, delta: str) -> str:
+        if self._done:
+            return ""
+        if not self._in_value:
+            self._buffer += delta
+            match = self._key.search(self._buffer)
+            if not match:
+                return ""
+            self._in_value = True
+            delta = self._buffer[match.end():]
+            self._buffer = ""
+
+        out = []
+        for char in delta:
+            if self._escape:
+                self._escape += char
+                decoded = self._decode_escape()
+                if decoded is not None:
+                    out.append(decoded)
+                    self._escape = ""
+            elif char == "\\":
+                self._escape = char
+            elif char == '"':
+                self._done = True
+                break
+            else:
+                out.append(char)
+        return "".join(out)
+
+    def _decode_escape(self):
+        escape = self._escape
+        if escape[1] != "u":
+            return ESCAPES.get(escape[1], escape[1])
+        if len(escape) < 6:
+            return None
+        # A high surrogate is only decodable together with the \uXXXX that follows it
+        if 0xD800 <= int(escape[2:6], 16) <= 0xDBFF and len(escape) < 12:
+            return None
+        return json.loads(f'"{escape}"')
+
+class JobEvents:
+    """In-process fan-out of job events to the clients streaming them"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def publish(self, job_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, data))
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers[job_id].add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[job_id]
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
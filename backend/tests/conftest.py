@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Keep in-process tests off the real database.db and away from the real provider
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+def auth_headers(user) -> dict:
+    from auth.jwt_handler import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+def make_user():
+    """A new user in the test database, detached so it can be used after its session closes"""
+    from database.connections import SessionLocal, create_tables
+    from database.models import User
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        user = User(id=str(uuid.uuid4()), email=f"{uuid.uuid4()}@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+@pytest.fixture
+def user():
+    return make_user()
+
+@pytest.fixture
+def client():
+    """TestClient for the app with the shared engine on the fake provider"""
+    from fastapi.testclient import TestClient
+    from fake_provider import FakeClient
+    from prompt_engine import get_default_engine
+    import app
+
+    get_default_engine().client = FakeClient()
+    with TestClient(app.app) as client:
+        yield client
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+class FakeCompletions:
+    """Stands in for client.chat.completions with a fixed latency and deterministic answers.
+
+    `score` is either every criterion's score or score(model, prompt, criterion).
+    """
+
+    def __init__(self, latency: float = 0.0, score: int = 7, refine=None):
+        self.latency = latency
+        self.score = score
+        self.refine = refine or (lambda prompt: f"{prompt} (refined)")
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.latency)
+
+        function = kwargs["tools"][0]["function"]
+        if function["name"] == "score_prompt":
+            criteria = [name for name in function["parameters"]["properties"] if name != "average"]
+            scores = {criterion: self._score(kwargs, criterion) for criterion in criteria}
+            arguments = scores | {"average": sum(scores.values()) / len(scores)}
+        else:
+            content = kwargs["messages"][-1]["content"]
+            prompt = content.removeprefix("Please refine this prompt: ").split(". Make this prompt better")[0]
+            arguments = {"refined_prompt": self.refine(prompt)}
+
+        # Like the real API, stop mid-arguments once max_tokens (~4 characters each) is used up
+        arguments = json.dumps(arguments)
+        completion_tokens = len(arguments) // 4 + 1
+        finish_reason = "stop"
+        if completion_tokens > kwargs["max_tokens"]:
+            arguments = arguments[:kwargs["max_tokens"] * 4]
+            completion_tokens = kwargs["max_tokens"]
+            finish_reason = "length"
+
+        usage = SimpleNamespace(prompt_tokens=len(json.dumps(kwargs["messages"])) // 4, completion_tokens=completion_tokens)
+        if kwargs.get("stream"):
+            return self._stream(function["name"], arguments, finish_reason, usage)
+
+        tool_call = SimpleNamespace(function=SimpleNamespace(name=function["name"], arguments=arguments))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(tool_calls=[tool_call]), finish_reason=finish_reason)],
+            usage=usage
+        )
+
+    def _score(self, kwargs, criterion):
+        if not callable(self.score):
+            return self.score
+        prompt = kwargs["messages"][-1]["content"].split('Prompt: "', 1)[1].rsplit('"', 1)[0]
+        return self.score(kwargs["model"], prompt, criterion)
+
+    async def _stream(self, name, arguments, finish_reason, usage, chunk_size=7):
+        """Yield chunks shaped like the API's streamed tool-call deltas, then a usage-only chunk"""
+        for start in range(0, len(arguments), chunk_size):
+            function = SimpleNamespace(name=name if start == 0 else None, arguments=arguments[start:start + chunk_size])
+            delta = SimpleNamespace(tool_calls=[SimpleNamespace(index=0, function=function)])
+            last = start + chunk_size >= len(arguments)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason if last else None)], usage=None)
+            await asyncio.sleep(0)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeCompletions(**kwargs))
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from admission import AdmissionController, OverloadedError
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+from scheduler import FairScheduler, current_tenant
+
+LATENCY = 0.02
+CAPACITY = 2
+MAX_SECONDS = 0.3
+ARRIVALS = 40
+ARRIVAL_INTERVAL = 0.005
+
+JOB = PromptRequest(prompt="Summarize this article for me", max_iterations=1, min_consecutive_improvements=1)
+
+async def simulate(max_seconds: float):
+    """A burst of jobs arriving far faster than the provider can serve them"""
+    scheduler = FairScheduler(CAPACITY)
+    engine = PromptEngine(scheduler=scheduler)
+    engine.client = FakeClient(latency=LATENCY)
+    admission = AdmissionController(scheduler, max_seconds)
+    retry_after = []
+
+    async def job(user_id):
+        current_tenant.set((user_id, "free"))
+        started = time.perf_counter()
+        try:
+            result = await engine.improve_prompt(JOB)
+        finally:
+            admission.finish(result["metrics"]["llm_calls"])
+        assert result["status"] == "completed"
+        return time.perf_counter() - started
+
+    admitted = []
+    for user in range(ARRIVALS):
+        try:
+            admission.admit()
+        except OverloadedError as e:
+            retry_after.append(e.retry_after)
+        else:
+            admitted.append(asyncio.create_task(job(f"user-{user}")))
+        await asyncio.sleep(ARRIVAL_INTERVAL)
+    return await asyncio.gather(*admitted), retry_after
+
+def test_admitted_jobs_finish_within_deadline_under_overload():
+    unbounded, _ = asyncio.run(simulate(max_seconds=0))
+    admitted, retry_after = asyncio.run(simulate(max_seconds=MAX_SECONDS))
+
+    assert len(unbounded) == ARRIVALS
+    assert max(unbounded) > MAX_SECONDS * 3
+    assert retry_after and all(seconds >= 1 for seconds in retry_after)
+    assert max(admitted) < MAX_SECONDS * 1.5
+
+def test_limit_follows_observed_latency():
+    scheduler = FairScheduler(CAPACITY)
+    admission = AdmissionController(scheduler, max_seconds=60)
+    admission.track()
+    admission.finish(llm_calls=10)
+
+    scheduler.call_seconds = 1.0
+    assert admission.limit == 12
+    scheduler.call_seconds = 3.0
+    assert admission.limit == 4
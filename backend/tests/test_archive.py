@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from database.connections import SessionLocal
+from database.models import PromptResults, PromptResultArchive, ImprovementJob, ImprovementCheckpoint
+from services.archive_service import ArchiveService, compress_text
+from services.job_service import JobService
+from services.prompt_service import PromptService
+
+def test_expired_results_move_to_archive_in_batches(user):
+    db = SessionLocal()
+    try:
+        prompts = PromptService(db, user.id)
+        old = [prompts.save_prompt_result(f"Write poem number {n} " * 20, f"Write a short poem {n}", 2, final_score=7.0)
+               for n in range(5)]
+        recent = prompts.save_prompt_result("Write a story", "Write a short story", 1)
+        for row in old:
+            row.created_at = datetime.now(timezone.utc) - timedelta(days=100)
+        job = JobService(db).create_job(str(uuid.uuid4()), user.id, {"prompt": old[0].original_prompt})
+        for iteration in range(3):
+            JobService(db).save_checkpoint(job.id, {
+                "iteration": iteration,
+                "prompt": f"Write a short poem, take {iteration}",
+                "scores": {"relevance": 6 + iteration, "average": 6.0 + iteration},
+                "focus_criteria": ["relevance"],
+                "improvements_needed": [],
+                "consecutive_improvements": iteration,
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20},
+            })
+        JobService(db).finish_job(job.id, "completed", prompt_result_id=old[0].id)
+        trajectory = [JobService.checkpoint_to_dict(checkpoint) for checkpoint in JobService(db).get_trajectory(old[0].id)]
+        old_ids = [row.id for row in old]
+        originals = {row.id: row.original_prompt for row in old}
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+        archive = ArchiveService(db)
+        moved = [archive.archive_batch(cutoff, batch_size=2) for _ in range(4)]
+
+        assert moved == [2, 2, 1, 0]
+        assert db.query(PromptResults).filter(PromptResults.user_id == user.id).all() == [recent]
+        archived = db.get(PromptResultArchive, old_ids[0])
+        assert len(archived.original_prompt) < len(originals[old_ids[0]])
+
+        prompt = prompts.get_prompt_by_id(old_ids[0])
+        assert prompt.original_prompt == originals[old_ids[0]]
+        assert prompt.final_score == 7.0
+        assert PromptService(db, "someone-else").get_prompt_by_id(old_ids[0]) is None
+        assert db.get(ImprovementJob, job.id).prompt_result_id is None
+        assert archived.job_id == job.id
+        assert db.query(ImprovementCheckpoint).filter(ImprovementCheckpoint.job_id == job.id).count() == 0
+        assert [JobService.checkpoint_to_dict(checkpoint)
+                for checkpoint in JobService(db).get_trajectory(old_ids[0])] == trajectory
+    finally:
+        db.close()
+
+def test_expired_jobs_are_purged_with_their_checkpoints(user):
+    long_ago = datetime.now(timezone.utc) - timedelta(days=100)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+    db = SessionLocal()
+    try:
+        jobs = JobService(db)
+
+        def job(status, created_at=long_ago, checkpoints=2):
+            job_id = jobs.create_job(str(uuid.uuid4()), user.id, {"prompt": "Write a poem about the sea " * 20}).id
+            for iteration in range(checkpoints):
+                jobs.save_checkpoint(job_id, {"iteration": iteration, "prompt": f"Write a sea poem, take {iteration}",
+                                              "scores": {"average": 7.0}, "focus_criteria": [],
+                                              "improvements_needed": [], "consecutive_improvements": 0})
+            row = db.get(ImprovementJob, job_id)
+            row.status, row.created_at = status, created_at
+            db.commit()
+            return job_id
+
+        failed, running, recent = job("failed"), job("running"), job("failed", datetime.now(timezone.utc))
+        # Archived before trajectories moved along with the result: the job still holds its checkpoints
+        legacy = job("completed")
+        legacy_result = str(uuid.uuid4())
+        db.add(PromptResultArchive(id=legacy_result, user_id=user.id, job_id=legacy,
+                                   original_prompt=compress_text("Write a poem"), improved_prompt=compress_text("Poem"),
+                                   created_at=long_ago))
+        db.commit()
+
+        archive = ArchiveService(db)
+        while archive.purge_jobs(cutoff, batch_size=1):
+            pass
+
+        remaining = {job_id for (job_id,) in db.query(ImprovementJob.id).filter(ImprovementJob.user_id == user.id)}
+        assert remaining == {running, recent}
+        assert db.query(ImprovementCheckpoint).filter(ImprovementCheckpoint.job_id.in_([failed, legacy])).count() == 0
+        assert [checkpoint.prompt for checkpoint in JobService(db).get_trajectory(legacy_result)] == [
+            "Write a sea poem, take 0", "Write a sea poem, take 1"]
+        # Keep the app's job recovery in later tests from resuming it
+        jobs.finish_job(running, "failed")
+    finally:
+        db.close()
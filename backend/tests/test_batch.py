@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+
+import batch
+from batch import BatchRunner, parse_jsonl, read_completed_lines
+from conftest import auth_headers, make_user
+from fake_provider import FakeClient
+from prompt_engine import PromptEngine
+
+def line(prompt, **fields):
+    return json.dumps({"prompt": prompt, "max_iterations": 1, "min_consecutive_improvements": 1} | fields)
+
+def test_parse_jsonl_keeps_line_numbers_and_skips_blank_lines():
+    items = parse_jsonl("\n".join([line("Write a poem about rain"), "", line("Write a story about snow")]))
+
+    assert [(number, request.prompt) for number, request in items] == [
+        (1, "Write a poem about rain"), (3, "Write a story about snow")]
+
+@pytest.mark.parametrize("text, error", [
+    (line("Write a poem about rain") + "\n{not json", "Line 2"),
+    (line("short"), "Line 1"),
+    ("[1, 2]", "Line 1"),
+])
+def test_parse_jsonl_rejects_bad_lines(text, error):
+    with pytest.raises(ValueError, match=error):
+        parse_jsonl(text)
+
+def test_parse_jsonl_enforces_batch_size(monkeypatch):
+    monkeypatch.setattr(batch, "MAX_BATCH_SIZE", 1)
+    with pytest.raises(ValueError, match="limit is 1"):
+        parse_jsonl("\n".join([line("Write a poem about rain"), line("Write a story about snow")]))
+
+def test_runner_improves_identical_lines_once():
+    engine = PromptEngine()
+    engine.client = FakeClient()
+    text = "\n".join([line("Write a poem about rain"), line("Write a story about snow"), line("Write a poem about rain")])
+    results = []
+
+    async def on_result(result):
+        results.append(result)
+
+    asyncio.run(BatchRunner(engine, concurrency=3).run(parse_jsonl(text), on_result))
+
+    by_line = {result["line"]: result for result in results}
+    assert sorted(by_line) == [1, 2, 3]
+    assert all(result["status"] == "completed" for result in results)
+    assert [by_line[number]["duplicate_of"] for number in (1, 2, 3)] == [None, None, 1]
+    assert by_line[3]["final_prompt"] == by_line[1]["final_prompt"]
+    # Five calls (three scorings, two refinements) for each of the two distinct requests
+    assert len(engine.client.chat.completions.calls) == 10
+
+def test_read_completed_lines_skips_failed_and_partial_lines(tmp_path):
+    output = tmp_path / "results.jsonl"
+    assert read_completed_lines(str(output)) == set()
+
+    output.write_text("\n".join([
+        json.dumps({"line": 1, "status": "completed"}),
+        json.dumps({"line": 2, "status": "failed"}),
+        json.dumps({"line": 4, "status": "completed"}),
+        '{"line": 5, "sta',
+    ]))
+    assert read_completed_lines(str(output)) == {1, 4}
+
+def test_run_file_resumes_where_it_stopped(tmp_path, monkeypatch):
+    import prompt_engine
+
+    engine = PromptEngine()
+    engine.client = FakeClient()
+    monkeypatch.setattr(prompt_engine, "get_default_engine", lambda: engine)
+    source, output = tmp_path / "prompts.jsonl", tmp_path / "results.jsonl"
+    source.write_text("\n".join([line("Write a poem about rain"), line("Write a story about snow")]))
+    output.write_text(json.dumps({"line": 1, "status": "completed"}) + "\n")
+
+    asyncio.run(batch.run_file(str(source), str(output), concurrency=2))
+
+    results = [json.loads(row) for row in output.read_text().splitlines()]
+    assert [result["line"] for result in results] == [1, 2]
+    assert results[1]["original_prompt"] == "Write a story about snow"
+
+def test_duplicates_are_saved_and_counted_once(client, user):
+    body = "\n".join([line("Write a poem about rain")] * 3)
+
+    response = client.post("/batches", content=body, headers=auth_headers(user))
+    assert response.status_code == 200
+    batch_id = response.json()["batch_id"]
+
+    results = [json.loads(row) for row in
+               client.get(f"/batches/{batch_id}/results", headers=auth_headers(user)).text.splitlines()]
+    assert len(results) == 3
+    tokens = results[0]["metrics"]["prompt_tokens"] + results[0]["metrics"]["completion_tokens"]
+    totals = client.get("/stats", headers=auth_headers(user)).json()["totals"]
+    assert totals["jobs"] == 1
+    assert totals["tokens_used"] == tokens
+
+def test_batches_have_their_own_quota(client, user):
+    import app
+
+    app.user_requests[user.id] = [app.datetime.now()] * 5
+    assert client.post("/batches", content=line("Write a poem about rain"), headers=auth_headers(user)).status_code == 200
+
+    for _ in range(batch.BATCHES_PER_DAY - 1):
+        client.post("/batches", content=line("Write a poem about rain"), headers=auth_headers(user))
+    response = client.post("/batches", content=line("Write a poem about rain"), headers=auth_headers(user))
+    assert response.status_code == 429
+    assert len(app.user_requests[user.id]) == 5
+
+def test_batch_size_is_capped_by_tier(client, user, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_PROMPT_LIMITS", {"free": 2, "pro": 3})
+    body = "\n".join(line(f"Write a poem about rain number {n}") for n in range(3))
+
+    response = client.post("/batches", content=body, headers=auth_headers(user))
+    assert response.status_code == 413
+    assert "free tier allows 2" in response.json()["detail"]
+    assert batch.batch_prompt_limit("pro") == 3
+    assert batch.batch_prompt_limit("unknown") == 2
+
+def test_finished_batches_can_be_deleted_and_expire(client, user, monkeypatch):
+    import app
+
+    def create():
+        return client.post("/batches", content=line("Write a poem about rain"), headers=auth_headers(user)).json()["batch_id"]
+
+    deleted = create()
+    assert client.delete(f"/batches/{deleted}", headers=auth_headers(user)).status_code == 200
+    assert client.get(f"/batches/{deleted}", headers=auth_headers(user)).status_code == 404
+
+    expired = create()
+    assert client.get(f"/batches/{expired}", headers=auth_headers(user)).json()["status"] == "completed"
+    monkeypatch.setattr(app, "BATCH_RETENTION_SECONDS", -1)
+    assert client.get(f"/batches/{expired}", headers=auth_headers(user)).status_code == 404
+    assert expired not in app.batches
+
+def test_running_batch_cannot_be_deleted(client, user):
+    import app
+    from batch import BatchState
+
+    state = BatchState("running-batch", user.id, total=1)
+    app.batches[state.batch_id] = state
+    assert client.delete(f"/batches/{state.batch_id}", headers=auth_headers(user)).status_code == 409
+    assert client.delete(f"/batches/{state.batch_id}", headers=auth_headers(make_user())).status_code == 403
+    del app.batches[state.batch_id]
+
+def test_rejected_batches_do_not_use_the_quota(client, user, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_PROMPT_LIMITS", {"free": 1})
+    for body in ["{not json", "", "\n".join([line("Write a poem about rain"), line("Write a story about snow")])]:
+        assert client.post("/batches", content=body, headers=auth_headers(user)).status_code in (413, 422)
+
+    for _ in range(batch.BATCHES_PER_DAY):
+        assert client.post("/batches", content=line("Write a poem about rain"), headers=auth_headers(user)).status_code == 200
@@ -0,0 +1,64 @@
+import asyncio
+
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+
+REQUEST = PromptRequest(prompt="Write a haiku about autumn leaves", max_iterations=3, min_consecutive_improvements=3)
+
+def run(score, checkpoints=None, resume_from=None):
+    engine = PromptEngine(judge_model="strong-judge", cheap_judge_model="cheap-judge", score_cache_size=64)
+    engine.client = FakeClient(score=score)
+
+    async def checkpoint_callback(checkpoint):
+        checkpoints.append(checkpoint)
+
+    return asyncio.run(engine.improve_prompt(REQUEST, checkpoint_callback=checkpoint_callback if checkpoints is not None
+                                             else None, resume_from=resume_from))
+
+def biased_score(model, prompt, criterion):
+    # The strong judge is consistently one point more generous than the cheap one
+    if model == "strong-judge":
+        return 8
+    # A one-criterion dip on the second refinement is within the escalation margin
+    if prompt.count("(refined)") == 2 and criterion == "coherence":
+        return 6
+    return 7
+
+def test_steady_scores_do_not_escalate():
+    result = run(7)
+
+    assert result["metrics"]["judge_calls"] == {"cheap": 5, "strong": 0}
+    assert result["metrics"]["escalation_rate"] == 0
+
+def test_escalation_compares_strong_scores_with_strong_scores():
+    result = run(biased_score)
+
+    metrics = result["metrics"]
+    assert metrics["escalations"] == 1
+    assert metrics["judge_calls"] == {"cheap": 5, "strong": 2}
+    # Escalating re-scores the previous prompt too, so the strong judge's bias cancels out, and the next
+    # cheap verdict is compared against cheap scores instead of the strong ones
+    assert [iteration.improvements_needed for iteration in result["iterations"]] == [[], [], []]
+    assert [iteration.scores["average"] for iteration in result["iterations"]] == [8.0, 7.0, 7.0]
+    assert result["final_scores"]["average"] == result["initial_scores"]["average"] == 7.0
+
+def test_clear_regressions_are_not_escalated():
+    def score(model, prompt, criterion):
+        return 4 if prompt.count("(refined)") >= 2 else 7
+
+    result = run(score)
+
+    assert result["metrics"]["escalations"] == 0
+    assert result["iterations"][0].improvements_needed == ["relevance", "coherence", "simplicity", "depth"]
+
+def test_resume_after_escalation_compares_cheap_scores():
+    checkpoints = []
+    full = run(biased_score, checkpoints)
+    assert checkpoints[1]["scores"]["average"] == 8.0
+    assert checkpoints[1]["baseline_scores"]["average"] == 6.75
+
+    resumed = run(biased_score, resume_from=checkpoints[1])
+
+    assert [iteration.improvements_needed for iteration in resumed["iterations"]] == \
+        [iteration.improvements_needed for iteration in full["iterations"][1:]] == [[], []]
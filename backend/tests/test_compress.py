@@ -0,0 +1,59 @@
+import asyncio
+
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine, conciseness_score
+from tokens import count_tokens
+
+PROMPT = "Please could you kindly write for me a short and simple story about a small robot who learns to paint"
+
+def drop_last_word(prompt):
+    return prompt.rsplit(" ", 1)[0]
+
+def run(objective, refine):
+    engine = PromptEngine()
+    engine.client = FakeClient(refine=refine)
+    request = PromptRequest(prompt=PROMPT, max_iterations=3, min_consecutive_improvements=3, objective=objective)
+    return asyncio.run(engine.improve_prompt(request))
+
+def test_conciseness_score_scales_with_length():
+    assert conciseness_score(50, 100) == 10
+    assert conciseness_score(100, 100) == 5
+    assert conciseness_score(200, 100) == 1
+
+def test_compress_prefers_shortest_prompt_when_quality_ties():
+    result = run("compress", drop_last_word)
+
+    prompts = [iteration.prompt for iteration in result["iterations"]]
+    assert result["final_prompt"] == min(prompts, key=len)
+    assert all(iteration.scores.get("conciseness") is not None for iteration in result["iterations"])
+    metrics = result["metrics"]
+    assert metrics["original_tokens"] == count_tokens(PROMPT)
+    assert metrics["tokens_saved"] == metrics["original_tokens"] - count_tokens(result["final_prompt"]) > 0
+
+def test_compress_keeps_original_when_refinements_only_grow():
+    result = run("compress", lambda prompt: f"{prompt} (refined)")
+
+    assert result["final_prompt"] == PROMPT
+    assert result["metrics"]["tokens_saved"] == 0
+
+def test_quality_objective_is_unchanged():
+    result = run("quality", lambda prompt: f"{prompt} (refined)")
+
+    assert result["final_prompt"] == result["iterations"][-1].prompt
+    assert result["iterations"][-1].scores.get("conciseness") is None
+    assert "tokens_saved" not in result["metrics"]
+
+def test_conciseness_can_be_a_quality_criterion():
+    engine = PromptEngine()
+    engine.client = FakeClient(refine=drop_last_word)
+    request = PromptRequest(prompt=PROMPT, criteria=["conciseness", "clarity"], max_iterations=2,
+                            min_consecutive_improvements=2)
+
+    result = asyncio.run(engine.improve_prompt(request))
+
+    assert result["status"] == "completed", result["error"]
+    assert set(result["final_scores"]) == {"conciseness", "clarity", "average"}
+    assert result["final_scores"]["conciseness"] > 5
+    assert result["final_prompt"] == result["iterations"][-1].prompt
+    assert "tokens_saved" not in result["metrics"]
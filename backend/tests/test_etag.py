@@ -0,0 +1,74 @@
+import uuid
+
+from conftest import auth_headers
+from database.connections import SessionLocal
+from models import PromptRequest
+from services.prompt_service import PromptService
+
+def get(client, user, path, etag=None):
+    headers = auth_headers(user) | ({"If-None-Match": etag} if etag else {})
+    return client.get(path, headers=headers)
+
+def test_job_status_revalidates_until_the_job_changes(client, user):
+    import app
+
+    job_id = str(uuid.uuid4())
+    app.jobs[job_id] = app.new_job_entry(job_id, user.id, PromptRequest(prompt="Write a haiku about autumn"))
+    try:
+        first = get(client, user, f"/job/{job_id}")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == app.CACHE_CONTROL
+
+        unchanged = get(client, user, f"/job/{job_id}", etag)
+        assert unchanged.status_code == 304
+        assert unchanged.headers["ETag"] == etag
+        assert unchanged.content == b""
+        # Weak comparison, and any tag in a list
+        assert get(client, user, f"/job/{job_id}", f'"other", {etag.removeprefix("W/")}').status_code == 304
+
+        app.update_job(job_id, status="running", progress=1)
+        changed = get(client, user, f"/job/{job_id}", etag)
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert changed.json()["progress"] == 1
+    finally:
+        del app.jobs[job_id]
+
+def test_job_etag_changes_across_a_restart(client, user, monkeypatch):
+    import app
+
+    job_id = str(uuid.uuid4())
+    request = PromptRequest(prompt="Write a haiku about autumn")
+    app.jobs[job_id] = app.new_job_entry(job_id, user.id, request)
+    try:
+        etag = get(client, user, f"/job/{job_id}").headers["ETag"]
+
+        # A new process recovers the job with its version back at 0
+        monkeypatch.setattr(app, "PROCESS_ID", str(uuid.uuid4()))
+        app.jobs[job_id] = app.new_job_entry(job_id, user.id, request)
+        recovered = get(client, user, f"/job/{job_id}", etag)
+        assert recovered.status_code == 200
+        assert recovered.headers["ETag"] != etag
+    finally:
+        del app.jobs[job_id]
+
+def test_history_etag_changes_with_new_rows(client, user):
+    def save(prompt):
+        db = SessionLocal()
+        try:
+            PromptService(db, user.id).save_prompt_result(prompt, f"{prompt} briefly", 1)
+        finally:
+            db.close()
+
+    save("Write a haiku about autumn")
+    first = get(client, user, "/prompt-history")
+    etag = first.headers["ETag"]
+    assert len(first.json()["prompts"]) == 1
+    assert get(client, user, "/prompt-history", etag).status_code == 304
+
+    save("Write a haiku about winter")
+    changed = get(client, user, "/prompt-history", etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()["prompts"]) == 2
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import uuid
+
+from conftest import auth_headers, make_user
+from database.connections import SessionLocal
+from database.models import ImprovementJob
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+from services.job_service import JobService
+from services.prompt_service import PromptService
+
+REQUEST = PromptRequest(prompt="Write a haiku about autumn leaves", max_iterations=4, min_consecutive_improvements=4)
+
+def run(engine, resume_from=None):
+    checkpoints = []
+
+    async def checkpoint_callback(checkpoint):
+        checkpoints.append(checkpoint)
+
+    result = asyncio.run(engine.improve_prompt(REQUEST, checkpoint_callback=checkpoint_callback,
+                                               resume_from=resume_from))
+    return result, checkpoints
+
+def job_row(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(ImprovementJob, job_id)
+    finally:
+        db.close()
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_resume_continues_from_checkpoint():
+    engine = PromptEngine()
+    engine.client = FakeClient()
+    full, checkpoints = run(engine)
+    assert [checkpoint["iteration"] for checkpoint in checkpoints] == [0, 1, 2, 3, 4]
+
+    engine.client = FakeClient()
+    resumed, resumed_checkpoints = run(engine, resume_from=checkpoints[2])
+
+    assert [iteration.iteration for iteration in resumed["iterations"]] == [3, 4]
+    assert [checkpoint["iteration"] for checkpoint in resumed_checkpoints] == [3, 4]
+    assert resumed["total_iterations"] == 4
+    assert resumed["final_prompt"] == full["final_prompt"]
+    assert resumed["initial_scores"] is None
+    # Two refinements and two scorings; iterations 0-2 are not paid for again
+    assert len(engine.client.chat.completions.calls) == 4
+
+def test_startup_resumes_interrupted_jobs_and_fails_unresumable_ones(user):
+    db = SessionLocal()
+    try:
+        jobs = JobService(db)
+        resumable = jobs.create_job(str(uuid.uuid4()), user.id, REQUEST.model_dump()).id
+        jobs.save_checkpoint(resumable, {
+            "iteration": 1,
+            "prompt": "Write a haiku about autumn leaves (refined)",
+            "scores": {"relevance": 7, "coherence": 7, "simplicity": 7, "depth": 7, "average": 7.0},
+            "focus_criteria": REQUEST.criteria,
+            "improvements_needed": [],
+            "consecutive_improvements": 1,
+        })
+        broken = jobs.create_job(str(uuid.uuid4()), user.id, {"prompt": "too short"}).id
+        jobs.mark_running(broken)
+    finally:
+        db.close()
+
+    from fastapi.testclient import TestClient
+    from prompt_engine import get_default_engine
+    import app
+
+    get_default_engine().client = FakeClient()
+    with TestClient(app.app) as client:
+        wait_for(lambda: job_row(resumable).status == "completed")
+        assert broken not in app.jobs
+        assert job_row(broken).status == "failed"
+        prompt_id = job_row(resumable).prompt_result_id
+
+        response = client.get(f"/prompt-history/{prompt_id}/trajectory", headers=auth_headers(user))
+        assert response.status_code == 200
+        trajectory = response.json()["iterations"]
+        assert [iteration["iteration"] for iteration in trajectory] == [1, 2, 3, 4]
+        assert trajectory[-1]["prompt"] == app.jobs[resumable]["final_prompt"]
+
+def test_trajectory_is_private(client, user):
+    db = SessionLocal()
+    try:
+        prompt_id = PromptService(db, user.id).save_prompt_result("Write a poem", "Write a short poem", 1).id
+    finally:
+        db.close()
+
+    assert client.get(f"/prompt-history/{prompt_id}/trajectory", headers=auth_headers(user)).json() == {
+        "prompt_id": prompt_id, "iterations": []}
+    response = client.get(f"/prompt-history/{prompt_id}/trajectory", headers=auth_headers(make_user()))
+    assert response.status_code == 404
+
+def test_only_stale_jobs_are_claimed_and_only_once(user):
+    from datetime import datetime, timedelta, timezone
+
+    db = SessionLocal()
+    try:
+        jobs = JobService(db)
+        live = jobs.create_job(str(uuid.uuid4()), user.id, REQUEST.model_dump(), owner="replica-a").id
+        orphaned = jobs.create_job(str(uuid.uuid4()), user.id, REQUEST.model_dump(), owner="replica-b").id
+        db.get(ImprovementJob, orphaned).heartbeat_at = datetime.now(timezone.utc) - timedelta(minutes=10)
+        db.commit()
+        stale_before = datetime.now(timezone.utc) - timedelta(minutes=2)
+
+        claimed = [job.id for job in jobs.claim_interrupted_jobs("replica-c", stale_before)]
+        assert orphaned in claimed and live not in claimed
+        assert orphaned not in [job.id for job in jobs.claim_interrupted_jobs("replica-d", stale_before)]
+        assert job_row(orphaned).owner == "replica-c"
+
+        jobs.renew_leases("replica-c")
+        assert job_row(orphaned).heartbeat_at > stale_before.replace(tzinfo=None)
+    finally:
+        db.close()
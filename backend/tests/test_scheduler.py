@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+from scheduler import FairScheduler, current_tenant
+
+LATENCY = 0.02
+CAPACITY = 2
+
+HEAVY_JOB = PromptRequest(prompt="Write a detailed report on the market", max_iterations=20, min_consecutive_improvements=5)
+LIGHT_JOB = PromptRequest(prompt="Summarize this article for me", max_iterations=1, min_consecutive_improvements=1)
+LIGHT_USERS = 6
+# initial score + first refine/score + one loop iteration of refine/score
+LIGHT_JOB_CALLS = 6
+
+def p95(values):
+    ordered = sorted(values)
+    return ordered[max(0, int(round(0.95 * len(ordered))) - 1)]
+
+async def run_job(engine, request, user_id, tier="free"):
+    current_tenant.set((user_id, tier))
+    started = time.perf_counter()
+    result = await engine.improve_prompt(request)
+    assert result["status"] == "completed"
+    return time.perf_counter() - started
+
+async def simulate(fair: bool):
+    """One heavy user with many concurrent long jobs vs. several light users with one short job each"""
+    engine = PromptEngine(scheduler=FairScheduler(CAPACITY))
+    engine.client = FakeClient(latency=LATENCY)
+
+    def tenant(user_id):
+        # Without fair sharing every call is queued in arrival order, as if from one user
+        return user_id if fair else "everyone"
+
+    heavy = [asyncio.create_task(run_job(engine, HEAVY_JOB, tenant("heavy"))) for _ in range(10)]
+    await asyncio.sleep(LATENCY)
+    light = [
+        asyncio.create_task(run_job(engine, LIGHT_JOB, tenant(f"light-{user}")))
+        for user in range(LIGHT_USERS)
+    ]
+    light_times = await asyncio.gather(*light)
+    await asyncio.gather(*heavy)
+    return light_times
+
+def test_light_users_p95_stays_bounded_under_heavy_user():
+    fifo = asyncio.run(simulate(fair=False))
+    fair = asyncio.run(simulate(fair=True))
+
+    # Each active user is owed CAPACITY / active_users of the slots, so a light job's
+    # sequential calls should finish within that share no matter how much the heavy user queues
+    active_users = LIGHT_USERS + 1
+    fair_share_bound = LIGHT_JOB_CALLS * LATENCY * active_users / CAPACITY
+    assert p95(fair) < fair_share_bound * 1.5
+    assert p95(fair) < p95(fifo) * 0.75
+
+def test_weights_split_capacity_by_tier():
+    async def scenario():
+        scheduler = FairScheduler(1, {"free": 1.0, "pro": 4.0})
+        order = []
+
+        async def call(user_id, tier):
+            current_tenant.set((user_id, tier))
+            async with scheduler.slot():
+                order.append(tier)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("warmup", "free")
+        calls = [asyncio.create_task(call("a", "free")) for _ in range(10)]
+        calls += [asyncio.create_task(call("b", "pro")) for _ in range(10)]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*calls)
+        return order
+
+    order = asyncio.run(scenario())
+    # While both are backlogged the pro user gets ~4 calls for every free call
+    assert order[:10].count("pro") == 8
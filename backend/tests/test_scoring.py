@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+from scoring import get_criteria_set
+
+def test_weighted_average_of_score_matrix():
+    criteria_set = get_criteria_set(("accuracy", "tone", "brevity"), (2.0, 1.0, 1.0))
+    candidates = np.array([[8, 4, 4], [6, 6, 6], [4, 8, 8]], dtype=float)
+
+    assert criteria_set.average(candidates).tolist() == [6.0, 6.0, 6.0]
+    assert criteria_set.average(candidates[0]) == 6.0
+    assert criteria_set.to_dict(candidates[0]) == {"accuracy": 8, "tone": 4, "brevity": 4, "average": 6.0}
+
+def test_regressions_across_candidates():
+    criteria_set = get_criteria_set(("accuracy", "tone", "brevity"))
+    previous = criteria_set.vector({"accuracy": 6, "tone": 6, "brevity": 6})
+    candidates = np.array([[7, 5, 6], [6, 6, 6], [5, 5, 8]], dtype=float)
+
+    assert criteria_set.regressions(previous, candidates).tolist() == [
+        [False, True, False],
+        [False, False, False],
+        [True, True, False],
+    ]
+    assert criteria_set.regressed(previous, candidates[2]) == ["accuracy", "tone"]
+
+def test_vector_keeps_order_and_fills_missing():
+    criteria_set = get_criteria_set(("accuracy", "tone"))
+    previous = np.array([3.0, 9.0])
+
+    assert criteria_set.vector({"tone": 7, "average": 7.0}).tolist() == [5.0, 7.0]
+    assert criteria_set.vector({"accuracy": 8}, previous).tolist() == [8.0, 9.0]
+
+def test_custom_criteria_are_scored_and_returned():
+    engine = PromptEngine()
+    engine.client = FakeClient(score=8)
+    request = PromptRequest(prompt="Write a limerick about cats", criteria=["Factual Accuracy", "tone"],
+                            criteria_weights={"factual_accuracy": 3}, max_iterations=1,
+                            min_consecutive_improvements=1)
+
+    result = asyncio.run(engine.improve_prompt(request))
+
+    scored = engine.client.chat.completions.calls[0]["tools"][0]["function"]["parameters"]["properties"]
+    assert set(scored) >= {"factual_accuracy", "tone"}
+    assert result["final_scores"] == {"factual_accuracy": 8, "tone": 8, "average": 8.0}
+    assert result["iterations"][-1].scores.model_dump() == result["final_scores"]
+
+def test_criteria_names_are_slugified():
+    request = PromptRequest(prompt="Write a limerick about cats", criteria=["tone-of-voice", "Clarity & Tone", "Clarté"],
+                            criteria_weights={"Tone of voice": 2})
+
+    assert request.criteria == ["tone_of_voice", "clarity_tone", "clarte"]
+    assert request.criteria_weights == {"tone_of_voice": 2}
+
+@pytest.mark.parametrize("fields", [
+    {"criteria": ["average"]},
+    {"criteria": ["--"]},
+    {"criteria": ["tone"], "criteria_weights": {"accuracy": 1}},
+    {"criteria": ["tone"], "criteria_weights": {"tone": 0}},
+])
+def test_invalid_criteria_are_rejected(fields):
+    with pytest.raises(ValidationError):
+        PromptRequest(prompt="Write a limerick about cats", **fields)
+
+def test_incremental_scoring_judges_focus_plus_one_control_criterion():
+    def score(model, prompt, criterion):
+        # Coherence drops with every refinement, so each iteration focuses on it alone
+        return 7 - prompt.count("(refined)") if criterion == "coherence" else 7
+
+    engine = PromptEngine(incremental_scoring=True, full_rescore_interval=3)
+    engine.client = FakeClient(score=score)
+    request = PromptRequest(prompt="Write a limerick about cats", max_iterations=2, min_consecutive_improvements=2)
+
+    result = asyncio.run(engine.improve_prompt(request))
+
+    scored = [set(call["tools"][0]["function"]["parameters"]["properties"])
+              for call in engine.client.chat.completions.calls if call["tools"][0]["function"]["name"] == "score_prompt"]
+    everything = {"relevance", "coherence", "simplicity", "depth"}
+    # Initial and warm-up scores, two incremental iterations with rotating controls, then the final full re-score
+    assert scored == [everything, everything, {"coherence", "simplicity"}, {"coherence", "depth"}, everything]
+    assert result["iterations"][-1].scores.model_dump() == result["final_scores"]
+    assert result["final_scores"]["coherence"] == 4
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import make_user
+from database.connections import SessionLocal
+from database.search import build_fts_query
+from services.archive_service import ArchiveService
+from services.prompt_service import PromptService
+
+def found(prompts, query):
+    return [row["id"] for row in prompts.search_prompt_history(query)["results"]]
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+def test_index_follows_inserts_updates_and_deletes(db, user):
+    prompts = PromptService(db, user.id)
+    row = prompts.save_prompt_result("Describe a lighthouse keeper", "Describe a lonely lighthouse keeper", 1)
+    assert found(prompts, "lighthouse") == [row.id]
+
+    row.improved_prompt = "Describe a weathered fisherman"
+    row.original_prompt = "Describe a fisherman"
+    db.commit()
+    assert found(prompts, "lighthouse") == []
+    assert found(prompts, "fisherman") == [row.id]
+
+    db.delete(row)
+    db.commit()
+    assert found(prompts, "fisherman") == []
+
+def test_archived_rows_leave_the_index(db, user):
+    prompts = PromptService(db, user.id)
+    row = prompts.save_prompt_result("Summarize the glacier report", "Summarize the glacier report briefly", 1)
+    row.created_at = datetime.now(timezone.utc) - timedelta(days=400)
+    db.commit()
+    assert found(prompts, "glacier") == [row.id]
+
+    while ArchiveService(db).archive_batch(datetime.now(timezone.utc) - timedelta(days=365), batch_size=50):
+        pass
+    assert found(prompts, "glacier") == []
+
+def test_results_are_limited_to_the_current_user(db, user):
+    mine = PromptService(db, user.id).save_prompt_result("Plan a volcano field trip", "Plan a volcano trip", 1)
+    PromptService(db, make_user().id).save_prompt_result("Plan a volcano lesson", "Plan a volcano lesson", 1)
+
+    result = PromptService(db, user.id).search_prompt_history("volcano")
+    assert [row["id"] for row in result["results"]] == [mine.id]
+    assert result["total"] == 1
+
+@pytest.mark.parametrize("query, expected", [
+    ("lighthouse keeper", '"lighthouse" "keeper"*'),
+    ('say "hi', '"say" "hi"*'),
+    ("NEAR(a b", '"NEAR" "a" "b"*'),
+    ("light*", '"light"*'),
+    ("cats OR dogs", '"cats" "OR" "dogs"*'),
+    ('"*', ""),
+])
+def test_fts_query_quotes_operators(query, expected):
+    assert build_fts_query(query) == expected
+
+@pytest.mark.parametrize("query", ['"', "NEAR(", "*", "OR", "AND NOT", 'x" OR "y', "col:umn"])
+def test_operator_input_is_searched_safely(db, user, query):
+    prompts = PromptService(db, user.id)
+    prompts.save_prompt_result("Write an ode to the OR gate", "Write an ode to the OR gate", 1)
+
+    result = prompts.search_prompt_history(query)
+    assert result["total"] == len(result["results"])
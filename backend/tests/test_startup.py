@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import time
+
+from conftest import BACKEND_DIR
+
+# Cumulative import time budget for `import app`, in milliseconds
+IMPORT_BUDGET_MS = int(os.getenv("STARTUP_IMPORT_BUDGET_MS", "2000"))
+
+# Modules that must stay off the import path and load on first use instead
+DEFERRED_MODULES = ["openai", "passlib", "jose", "bcrypt", "numpy"]
+
+def import_times():
+    """Run `python -X importtime -c 'import app'` and return {module: cumulative_us}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, env={**os.environ, "OPENAI_API_KEY": ""}
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|").split("|")]
+        if cumulative_us.isdigit():
+            times[name] = int(cumulative_us)
+    return times
+
+def test_app_import_within_budget():
+    times = import_times()
+    assert times["app"] / 1000 < IMPORT_BUDGET_MS, f"import app took {times['app'] / 1000:.0f}ms"
+
+def test_heavy_clients_are_not_imported_eagerly():
+    times = import_times()
+    eager = [module for module in DEFERRED_MODULES if module in times]
+    assert not eager, f"imported at startup: {eager}"
+
+def test_ready_reports_warm_dependencies():
+    from fastapi.testclient import TestClient
+    import app
+
+    with TestClient(app.app) as client:
+        assert client.get("/health").status_code == 200
+        # lifespan hands provider warm-up to a thread; wait for it before asserting
+        for _ in range(100):
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.05)
+        assert response.status_code == 200
+        assert response.json()["checks"] == {"database": True, "provider": True}
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+from conftest import make_user
+from database.connections import SessionLocal
+from services.prompt_service import PromptService
+from services.stats_service import StatsService
+
+def test_rollup_tracks_saved_results(user):
+    db = SessionLocal()
+    try:
+        prompts = PromptService(db, user.id)
+        prompts.save_prompt_result("Write a poem", "Write a short poem", 2, initial_score=5.0, final_score=7.5,
+                                   tokens_used=400)
+        prompts.save_prompt_result("Write a story", "Write a short story", 3, initial_score=6.0, final_score=6.5,
+                                   tokens_used=600)
+        # Resumed jobs have no initial score and are left out of the score gain
+        prompts.save_prompt_result("Write a song", "Write a short song", 1, final_score=8.0, tokens_used=100)
+
+        stats = StatsService(db).get_user_stats(user.id, days=7)
+    finally:
+        db.close()
+
+    assert [day["period"] for day in stats["days"]] == [datetime.now(timezone.utc).date().isoformat()]
+    totals = stats["totals"]
+    assert totals["jobs"] == 3
+    assert totals["iterations"] == 6
+    assert totals["average_score_gain"] == 1.5
+    assert totals["tokens_used"] == 1100
+
+def test_rollup_is_per_user():
+    busy, idle = make_user(), make_user()
+    db = SessionLocal()
+    try:
+        PromptService(db, busy.id).save_prompt_result("Write a poem", "Write a short poem", 2)
+
+        assert StatsService(db).get_user_stats(busy.id)["totals"]["jobs"] == 1
+        assert StatsService(db).get_user_stats(idle.id) == {
+            "days": [],
+            "totals": {"period": "last 30 days", "jobs": 0, "iterations": 0, "average_score_gain": None,
+                       "tokens_used": 0},
+            "total_prompts": 0,
+        }
+    finally:
+        db.close()
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+from streaming import PartialFieldParser
+
+ARGUMENTS = json.dumps({
+    "token_count": 12,
+    "refined_prompt": 'Say "hi" \\ then\nwrite a poem about cafés \U0001F600 in <10 lines',
+    "keywords_added": ["poem"],
+})
+
+def feed_in_pieces(pieces):
+    parser = PartialFieldParser("refined_prompt")
+    return "".join(parser.feed(piece) for piece in pieces)
+
+def test_parser_decodes_field_however_the_stream_is_split():
+    expected = json.loads(ARGUMENTS)["refined_prompt"]
+    assert feed_in_pieces(list(ARGUMENTS)) == expected
+    for cut in range(len(ARGUMENTS)):
+        assert feed_in_pieces([ARGUMENTS[:cut], ARGUMENTS[cut:]]) == expected
+
+def test_streamed_run_matches_non_streamed_run():
+    request = PromptRequest(prompt='Write a "short" story about a robot', max_iterations=3, min_consecutive_improvements=3)
+
+    def run(refinement_callback=None):
+        engine = PromptEngine()
+        engine.client = FakeClient()
+        return asyncio.run(engine.improve_prompt(request, refinement_callback=refinement_callback))
+
+    streamed_text = {}
+
+    async def collect(iteration, event):
+        if event.get("restart"):
+            streamed_text[iteration] = ""
+        else:
+            streamed_text[iteration] = streamed_text.get(iteration, "") + event["delta"]
+
+    plain = run()
+    streamed = run(collect)
+
+    assert streamed["final_prompt"] == plain["final_prompt"]
+    assert [i.prompt for i in streamed["iterations"]] == [i.prompt for i in plain["iterations"]]
+    assert [i.scores for i in streamed["iterations"]] == [i.scores for i in plain["iterations"]]
+    for iteration in streamed["iterations"]:
+        assert streamed_text[iteration.iteration] == iteration.prompt
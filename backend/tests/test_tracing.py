@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import tracing
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+
+def run_traced(monkeypatch, tmp_path, enabled=True):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", enabled)
+    monkeypatch.setattr(tracing, "_exporter", None)
+    monkeypatch.setenv("TRACE_EXPORT_PATH", str(tmp_path / "traces.jsonl"))
+    engine = PromptEngine()
+    engine.client = FakeClient()
+    request = PromptRequest(prompt="Write a story about a robot", max_iterations=2, min_consecutive_improvements=2)
+
+    async def run():
+        with tracing.trace("job", job_id="job-1") as job_trace:
+            result = await engine.improve_prompt(request)
+        return job_trace, result
+
+    return asyncio.run(run())
+
+def test_llm_calls_are_traced_under_their_phase(monkeypatch, tmp_path):
+    job_trace, result = run_traced(monkeypatch, tmp_path)
+
+    spans = {span.span_id: span for span in job_trace.spans}
+    calls = [span for span in job_trace.spans if span.name == "llm_call"]
+    assert len(calls) == result["metrics"]["llm_calls"]
+    assert sum(call.attributes["prompt_tokens"] for call in calls) == result["metrics"]["prompt_tokens"]
+    assert {spans[call.parent_span_id].name for call in calls} == {"score", "refine"}
+    assert job_trace.timings()["job"]["count"] == 1
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 1
+    exported = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(exported) == len(job_trace.spans)
+    assert all(span["traceId"] == job_trace.trace_id for span in exported)
+    assert sum("parentSpanId" not in span for span in exported) == 1
+
+def test_disabled_tracing_records_and_exports_nothing(monkeypatch, tmp_path):
+    job_trace, result = run_traced(monkeypatch, tmp_path, enabled=False)
+
+    assert job_trace is None
+    assert result["status"] == "completed"
+    assert tracing.start_span("llm_call") is tracing.NOOP_SPAN
+    assert not (tmp_path / "traces.jsonl").exists()
@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import tokens
+from fake_provider import FakeClient
+from models import PromptRequest
+from prompt_engine import PromptEngine
+
+PROMPT = "Write a haiku about autumn leaves"
+
+def run(refine, max_iterations=3, min_consecutive_improvements=3):
+    engine = PromptEngine()
+    engine.client = FakeClient(refine=refine)
+    request = PromptRequest(prompt=PROMPT, max_iterations=max_iterations,
+                            min_consecutive_improvements=min_consecutive_improvements)
+    return asyncio.run(engine.improve_prompt(request))
+
+def test_job_fails_when_every_refinement_is_truncated():
+    result = run(lambda prompt: prompt * 200)
+
+    assert result["status"] == "failed"
+    assert "truncated" in result["error"]
+    metrics = result["metrics"]
+    # Each of the four refinements was retried once with a bigger budget before giving up
+    assert metrics["refine_failures"] == 4
+    assert metrics["truncations"] == 8
+    # The error names the budget of the retry, not one it never tried
+    budget = PromptEngine().refine_budget(PROMPT, ["relevance", "coherence", "simplicity", "depth"])
+    assert f"max_tokens={2 * budget}" in result["error"]
+
+def test_truncated_refinements_are_counted():
+    # The first 20x refinement fits the budget; refining that again cannot fit even after the retry
+    result = run(lambda prompt: prompt * 20)
+
+    assert result["status"] == "completed"
+    metrics = result["metrics"]
+    assert metrics["refine_failures"] == 3
+    assert metrics["truncations"] == 6
+    assert "truncated" in metrics["last_refine_error"]
+    # The unchanged prompts handed back by the failed refinements are neither scored nor recorded
+    assert result["total_iterations"] == 3
+    assert result["iterations"] == []
+    assert result["final_prompt"] == PROMPT * 20
+    assert metrics["judge_calls"]["strong"] == 2
+
+def test_failed_refinement_does_not_count_toward_convergence():
+    calls = []
+
+    def refine(prompt):
+        calls.append(prompt)
+        if len(calls) == 3:
+            raise RuntimeError("provider hiccup")
+        return f"{prompt} (refined)"
+
+    result = run(refine, max_iterations=5, min_consecutive_improvements=2)
+
+    assert result["status"] == "completed"
+    assert result["metrics"]["refine_failures"] == 1
+    # Iteration 2 failed, so convergence took iterations 1 and 3
+    assert result["total_iterations"] == 3
+    assert [iteration.iteration for iteration in result["iterations"]] == [1, 3]
+
+def test_token_counts_are_estimated_when_the_encoding_cannot_load(monkeypatch):
+    def offline(name):
+        raise ConnectionError("cannot download the BPE file")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", SimpleNamespace(encoding_for_model=offline, get_encoding=offline))
+    tokens._encoding.cache_clear()
+    try:
+        assert tokens.count_tokens("a" * 40, "gpt-4o-mini") == 10
+    finally:
+        tokens._encoding.cache_clear()
@@ -0,0 +1,49 @@
+import json
+import logging
+import math
+from functools import lru_cache
+
+# (context window, max output tokens) per model
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128000, 16384),
+    "gpt-4o": (128000, 16384),
+    "gpt-4.1": (1047576, 32768),
+    "gpt-4.1-mini": (1047576, 32768),
+    "gpt-3.5-turbo": (16385, 4096),
+}
+DEFAULT_LIMITS = (16385, 4096)
+
+logger = logging.getLogger(__name__)
+
+class PromptTooLongError(ValueError):
+    """The prompt cannot fit in the model's context together with room for its refinement"""
+
+def model_limits(model: str):
+    return MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    # tiktoken is optional; without it we fall back to the ~4 characters per token rule of thumb
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The BPE file is downloaded on first use; without network access count like tiktoken is missing
+        logger.warning("tiktoken encoding for %s is unavailable; estimating token counts", model, exc_info=True)
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def count_request_tokens(model: str, messages: list, tools: list = None) -> int:
+    """Approximate input tokens of a chat request, including the tool schema"""
+    return count_tokens(json.dumps(messages), model) + (count_tokens(json.dumps(tools), model) if tools else 0)
@@ -0,0 +1,194 @@
+"""Per-job tracing.
+
+A job's phases are recorded as spans while it runs and summarised into a timing
+breakdown. When TRACE_EXPORT_PATH is set, each finished trace is also appended
+to a rotating JSON-lines file, one OTLP/JSON `resourceSpans` document per line,
+which the OpenTelemetry collector's file receiver and most trace viewers read.
+
+With TRACING_ENABLED=false no trace is started and span() is a context-variable
+lookup returning a shared no-op span.
+"""
+import contextvars
+import json
+import logging
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+SERVICE_NAME = "promptx-backend"
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+_parent_span_id = contextvars.ContextVar("parent_span_id", default=None)
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace, name: str, parent_span_id, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: BaseException = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.error = error
+        self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        """Duration so far for a span that is still open"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def end(self, error: BaseException = None):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.root = None
+
+    def timings(self) -> dict:
+        """Total milliseconds and count per span name; nested spans are also counted in their parents"""
+        spans = self.spans
+        if self.root is not None and self.root.end_ns is None:
+            spans = spans + [self.root]
+        breakdown = {}
+        for span in spans:
+            entry = breakdown.setdefault(span.name, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration_ms
+        for entry in breakdown.values():
+            entry["total_ms"] = round(entry["total_ms"], 2)
+        return breakdown
+
+def start_span(name: str, **attributes):
+    """Start a span that the caller ends explicitly; for intervals that do not fit a with block"""
+    trace = current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, _parent_span_id.get(), attributes)
+
+@contextmanager
+def span(name: str, **attributes):
+    current = start_span(name, **attributes)
+    if current is NOOP_SPAN:
+        yield current
+        return
+    token = _parent_span_id.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    finally:
+        _parent_span_id.reset(token)
+        current.end()
+
+@contextmanager
+def trace(name: str, **attributes):
+    """Trace everything under this block as one trace rooted at `name`; yields None when disabled"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    job_trace = Trace()
+    trace_token = current_trace.set(job_trace)
+    parent_token = _parent_span_id.set(None)
+    try:
+        with span(name, **attributes) as root:
+            job_trace.root = root
+            yield job_trace
+    finally:
+        _parent_span_id.reset(parent_token)
+        current_trace.reset(trace_token)
+        exporter = get_exporter()
+        if exporter is not None:
+            exporter.export(job_trace)
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+def to_otlp(job_trace: Trace) -> dict:
+    spans = []
+    for span in job_trace.spans:
+        otlp_span = {
+            "traceId": job_trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _attributes(span.attributes),
+            "status": {"code": 2, "message": str(span.error)} if span.error else {"code": 1},
+        }
+        if span.parent_span_id:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "promptx"}, "spans": spans}],
+        }]
+    }
+
+class TraceExporter:
+    """Append finished traces to a size-rotated JSON-lines file"""
+
+    def __init__(self, path: str, max_bytes: int = 10_000_000, backup_count: int = 5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"promptx.traces.{path}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.handlers = [handler]
+
+    def export(self, job_trace: Trace):
+        self._logger.info(json.dumps(to_otlp(job_trace), separators=(",", ":")))
+
+_exporter = None
+
+def get_exporter():
+    """The exporter configured by TRACE_EXPORT_PATH, or None when exporting is off"""
+    global _exporter
+    path = os.getenv("TRACE_EXPORT_PATH")
+    if not path:
+        return None
+    if _exporter is None:
+        _exporter = TraceExporter(
+            path,
+            max_bytes=int(os.getenv("TRACE_EXPORT_MAX_BYTES", "10000000")),
+            backup_count=int(os.getenv("TRACE_EXPORT_BACKUPS", "5"))
+        )
+    return _exporter